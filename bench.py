@@ -0,0 +1,273 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import PIL
+from PIL import Image
+
+import script
+import sinks
+
+# Micro benchmarks for the hot paths in script.py, run over a fixed sample of the
+# real sprites/ folders. Results are written as JSON and can be compared against
+# an earlier run:
+#
+#   python bench.py --output before.json
+#   python bench.py --baseline before.json
+
+def get_sample(count: int) -> list:
+    # Every n-th folder in name order, so the sample is the same on every machine
+    dirs = sorted(f.name for f in os.scandir('./sprites') if f.is_dir())
+    if count <= 0 or count >= len(dirs):
+        return dirs
+    step = len(dirs) / count
+    return [ dirs[int(i * step)] for i in range(count) ]
+
+def has_files(directory: str, *names) -> bool:
+    return all(os.path.exists(f'sprites/{directory}/{name}') for name in names)
+
+def get_overworld_frames(dirs: list) -> list:
+    frames = []
+    for dir in dirs:
+        if has_files(dir, 'overworld.png'):
+            image = Image.open(f'sprites/{dir}/overworld.png')
+            w, h = image.size
+            frames += [ image.crop((h * i, 0, h * (i + 1), h)) for i in range(w // h) ]
+    return frames
+
+# Each bench_* takes the sample and returns (function to time, calls per run)
+
+def bench_create_front_sprite(dirs: list):
+    dirs = [ dir for dir in dirs if has_files(dir, 'front.png') ]
+    def run():
+        sink = sinks.MemorySink()
+        for dir in dirs:
+            script.create_front_sprite(dir, sink=sink)
+    return run, len(dirs)
+
+def bench_create_back_sprite(dirs: list):
+    dirs = [ dir for dir in dirs if has_files(dir, 'back.png') ]
+    def run():
+        sink = sinks.MemorySink()
+        for dir in dirs:
+            script.create_back_sprite(dir, sink=sink)
+    return run, len(dirs)
+
+def bench_create_overworld_sprite(dirs: list):
+    def run():
+        sink = sinks.MemorySink()
+        for dir in dirs:
+            script.create_overworld_sprite(dir, dir not in script.mirror_exclusions, sink=sink)
+    return run, len(dirs)
+
+def bench_create_monster_icon(dirs: list):
+    def run():
+        sink = sinks.MemorySink()
+        for dir in dirs:
+            script.create_monster_icon(dir, sink=sink)
+    return run, len(dirs)
+
+def bench_get_animation(dirs: list):
+    # Includes compiling the animation program, the cache is emptied every run
+    dirs = [ dir for dir in dirs if has_files(dir, 'front.png', 'anim.asm', 'anim_idle.asm') ]
+    images = [ Image.open(f'sprites/{dir}/front.png') for dir in dirs ]
+    def run():
+        script.animation_programs.clear()
+        for dir, image in zip(dirs, images):
+            script.get_animation(image, dir)
+    return run, len(dirs)
+
+def bench_get_modified_asm(dirs: list):
+    paths = [ f'sprites/{dir}/{name}' for dir in dirs for name in ('anim.asm', 'anim_idle.asm') if has_files(dir, name) ]
+    def run():
+        for path in paths:
+            script.get_modified_asm(path)
+    return run, len(paths)
+
+def bench_get_center_of_mass(dirs: list):
+    frames = get_overworld_frames(dirs)
+    def run():
+        for frame in frames:
+            script.get_center_of_mass(frame)
+    return run, len(frames)
+
+def bench_get_centers_of_mass(dirs: list):
+    frames = get_overworld_frames(dirs)
+    strips = [ frames[i:i + 3] for i in range(0, len(frames) - 2, 3) ]
+    def run():
+        for strip in strips:
+            script.get_centers_of_mass(strip)
+    return run, len(strips)
+
+def bench_zip(dirs: list):
+    # The packaging step of the GUI build: every asset of the sample into a mod zip
+    sink = sinks.MemorySink()
+    for dir in dirs:
+        script.create_sprites(dir, force=True, sink=sink)
+    files = sink.files
+    path = os.path.join(tempfile.mkdtemp(), 'bench.zip')
+    def run():
+        # From scratch every time, bench_zip_update is the incremental case
+        if os.path.exists(path):
+            os.remove(path)
+        zip_sink = sinks.ZipSink(path)
+        for name, data in files:
+            zip_sink.write(name, data)
+        sinks.write_file(zip_sink, 'icon.png', 'resources/icon.png')
+        sinks.write_file(zip_sink, 'info.xml', 'resources/info.xml')
+        zip_sink.close()
+    return run, len(files)
+
+def bench_zip_update(dirs: list):
+    # Rebuilding the mod zip of the sample after one file changed
+    sink = sinks.MemorySink()
+    for dir in dirs:
+        script.create_sprites(dir, force=True, sink=sink)
+    files = sink.files
+    path = os.path.join(tempfile.mkdtemp(), 'bench.zip')
+    zip_sink = sinks.ZipSink(path)
+    for name, data in files:
+        zip_sink.write(name, data)
+    zip_sink.close()
+    changes = [ 0 ]
+    def run():
+        changes[0] += 1
+        zip_sink = sinks.ZipSink(path)
+        for i, (name, data) in enumerate(files):
+            zip_sink.write(name, data + bytes(changes[0]) if i == 0 else data)
+        zip_sink.close()
+    return run, len(files)
+
+def bench_import(modules: str):
+    # Cold start, a fresh interpreter importing modules. Includes the interpreter's
+    # own startup, 'python -c pass' is the floor.
+    def bench(dirs: list):
+        def run():
+            subprocess.run([ sys.executable, '-c', f'import {modules}' ], check=True)
+        return run, 1
+    return bench
+
+# Most a cold start may take in seconds, what script.py runs before it does
+# anything and gui.py before its window can show
+STARTUP_BUDGETS = {
+    'import_script': 0.15,
+    'import_gui': 0.25,
+}
+
+BENCHMARKS = {
+    'create_front_sprite': bench_create_front_sprite,
+    'create_back_sprite': bench_create_back_sprite,
+    'create_overworld_sprite': bench_create_overworld_sprite,
+    'create_monster_icon': bench_create_monster_icon,
+    'get_animation': bench_get_animation,
+    'get_modified_asm': bench_get_modified_asm,
+    'get_center_of_mass': bench_get_center_of_mass,
+    'get_centers_of_mass': bench_get_centers_of_mass,
+    'zip': bench_zip,
+    'zip_update': bench_zip_update,
+    'import_script': bench_import('script'),
+    'import_gui': bench_import('gui, customtkinter, PIL.ImageTk'),
+}
+
+def time_benchmark(run, iterations: int, warmup: int) -> list:
+    times = []
+    for i in range(warmup + iterations):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed)
+    return times
+
+def get_stats(times: list, calls: int) -> dict:
+    median = statistics.median(times)
+    return {
+        'calls': calls,
+        'iterations': len(times),
+        'median': median,
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'min': min(times),
+        'max': max(times),
+        'per_call': median / calls if calls else 0.0,
+    }
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    # Prints the median change per benchmark, returns False if anything got slower than threshold %
+    ok = True
+    print(f'\n{"benchmark":<26}{"baseline":>12}{"current":>12}{"change":>10}')
+    for name, stats in results.items():
+        if name not in baseline:
+            print(f'{name:<26}{"-":>12}{stats["median"] * 1000:>10.2f}ms{"new":>10}')
+            continue
+
+        before = baseline[name]['median']
+        change = (stats['median'] - before) / before * 100 if before else 0.0
+        mark = ''
+        if change > threshold:
+            mark = ' slower'
+            ok = False
+        elif change < -threshold:
+            mark = ' faster'
+        print(f'{name:<26}{before * 1000:>10.2f}ms{stats["median"] * 1000:>10.2f}ms{change:>+9.1f}%{mark}')
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the conversion functions on the sprites/ corpus.')
+    parser.add_argument('-n', '--iterations', type=int, default=5, help='timed runs per benchmark (default: 5)')
+    parser.add_argument('-w', '--warmup', type=int, default=1, help='untimed runs before timing (default: 1)')
+    parser.add_argument('-s', '--sample', type=int, default=40, help='number of sprite folders, 0 = all (default: 40)')
+    parser.add_argument('-b', '--benchmark', action='append', choices=BENCHMARKS, help='only run this benchmark, can be repeated')
+    parser.add_argument('-o', '--output', default='bench.json', help='where to write the results (default: bench.json)')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=5.0, help='percent change that counts as slower/faster (default: 5)')
+    args = parser.parse_args()
+
+    dirs = get_sample(args.sample)
+    results = {}
+    for name in args.benchmark or BENCHMARKS:
+        # The create_* functions print a line per sprite
+        with contextlib.redirect_stdout(io.StringIO()):
+            run, calls = BENCHMARKS[name](dirs)
+            times = time_benchmark(run, args.iterations, args.warmup)
+        results[name] = get_stats(times, calls)
+        stats = results[name]
+        print(f'{name:<26}{stats["median"] * 1000:>10.2f}ms median  ±{stats["stdev"] * 1000:.2f}ms  {stats["per_call"] * 1e6:>10.1f}us/call  ({calls} calls)')
+        if name in STARTUP_BUDGETS:
+            budget = STARTUP_BUDGETS[name]
+            print(f'{"":<26}{"within" if stats["median"] <= budget else "OVER"} the {budget * 1000:.0f}ms startup budget')
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'sample': len(dirs),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f'Wrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline['meta']['sample'] != len(dirs):
+            print(f'Warning: baseline used a sample of {baseline["meta"]["sample"]} folders, this run {len(dirs)}')
+        if not compare(results, baseline['results'], args.threshold):
+            raise SystemExit(1)
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import os
+from functools import cached_property
+from io import BytesIO
+from lazy import lazy_import
+
+Image = lazy_import('PIL.Image')
+
+# Everything the create_* functions read from one sprite folder. The folder is
+# listed once, every file is read at most once and every image decoded at most
+# once, however many stages (and the build manifest) ask for it:
+#
+#   bundle = SpriteBundle('bulbasaur')
+#   create_overworld_sprite('bulbasaur', bundle=bundle)
+#   create_monster_icon('bulbasaur', bundle=bundle)
+#
+# decodes overworld.png a single time. Missing files raise FileNotFoundError,
+# just like opening them directly would. files can be handed in from the sprite
+# index, the folder is only listed when it is not. root is the folder sprites/
+# is in.
+
+class SpriteBundle:
+    def __init__(self, directory: str, files=None, root='.'):
+        self.directory = directory
+        self.root = root
+        if files is not None:
+            self.files = list(files)
+        self.data = {}
+        self.images = {}
+        self.normal_palettes = {}
+
+    @cached_property
+    def files(self) -> list:
+        return [ f.name for f in os.scandir(os.path.join(self.root, 'sprites', self.directory)) ]
+
+    def read(self, name: str) -> bytes:
+        if name not in self.data:
+            with open(os.path.join(self.root, 'sprites', self.directory, name), 'rb') as f:
+                self.data[name] = f.read()
+        return self.data[name]
+
+    def image(self, name: str) -> Image:
+        # Shared between stages, callers crop and copy but never draw on it
+        if name not in self.images:
+            image = Image.open(BytesIO(self.read(name)))
+            image.load()
+            self.images[name] = image
+        return self.images[name]
+
+    def normal_rgb(self, name: str) -> list:
+        # Colors of the image that shiny.pal replaces, brightest first
+        if name not in self.normal_palettes:
+            # Get non black, white, transparent pixel colors
+            normal_rgb = [ color[1] for color in self.image(name).getcolors() ]
+            normal_rgb = [rgb for rgb in normal_rgb if (rgb != (255, 255, 255, 0) and rgb != (255, 255, 255, 255) and rgb != (0, 0, 0, 255))]
+            # then sort by 'brightness'
+            normal_rgb.sort(key = lambda x: x[0] *0.2126 + x[1] * 0.7152 + x[2] * 0.0722, reverse=True)
+            self.normal_palettes[name] = normal_rgb
+        return self.normal_palettes[name]
+
+    @cached_property
+    def shiny_rgb(self) -> list:
+        # shiny.pal rgb values, converted from rgb555 to rgb888
+        shiny_rgb = []
+        for line in self.read('shiny.pal').decode().splitlines():
+            line = line.strip()
+            if 'RGB' in line:
+                r = int(line.split(' ')[1].strip(',')) * 255 // 31
+                g = int(line.split(' ')[2].strip(',')) * 255 // 31
+                b = int(line.split(' ')[3].strip(',')) * 255 // 31
+                shiny_rgb.append((r, g, b, 255))
+        return shiny_rgb
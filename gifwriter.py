@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import struct
+from io import BytesIO
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+Image = lazy_import('PIL.Image')
+ImageFile = lazy_import('PIL.ImageFile')
+
+# A minimal GIF89a writer for P mode frames. The LZW data of a frame only depends
+# on its palette indices, so one encoding can be written out under any number of
+# palettes (normal and shiny) by swapping the global color table around it.
+
+def encode_frame(image: Image) -> bytes:
+    # LZW code size, data sub-blocks and block terminator for a P mode image.
+    # Same encoder and code size Pillow's GifImagePlugin uses.
+    fp = BytesIO()
+    fp.write(b'\x08')
+    ImageFile._save(image, fp, [('gif', (0, 0) + image.size, 0, 'P')])
+    fp.write(b'\x00')
+    return fp.getvalue()
+
+def get_transparency(palette: list):
+    # GIFs have no alpha channel, the fully transparent entry becomes the
+    # transparency index and everything else is drawn opaque.
+    for i, color in enumerate(palette):
+        if color[3] == 0:
+            return i
+    return None
+
+def get_color_table(palette: list):
+    # Color tables hold 2**(n+1) entries, returns the table bytes and n
+    bits = max(len(palette) - 1, 1).bit_length() - 1
+    table = b''.join(bytes(color[:3]) for color in palette)
+    return table.ljust(3 << (bits + 1), b'\x00'), bits
+
+def merge_frames(frames: list, durations: list):
+    # Identical consecutive frames become one frame shown for their summed
+    # duration. Summed in ms, only write_gif rounds to 1/100s.
+    merged = []
+    merged_durations = []
+    for frame, duration in zip(frames, durations):
+        if merged and merged[-1] == frame:
+            merged_durations[-1] += duration
+        else:
+            merged.append(frame)
+            merged_durations.append(duration)
+    return merged, merged_durations
+
+def get_bbox(mask: np.ndarray):
+    # (x, y, w, h) around the True pixels of a 2d mask, None if there are none
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    columns = np.flatnonzero(mask.any(axis=0))
+    return (int(columns[0]), int(rows[0]), int(columns[-1] - columns[0] + 1), int(rows[-1] - rows[0] + 1))
+
+def get_union(a: tuple, b: tuple) -> tuple:
+    x, y = min(a[0], b[0]), min(a[1], b[1])
+    return (x, y, max(a[0] + a[2], b[0] + b[2]) - x, max(a[1] + a[3], b[1] + b[3]) - y)
+
+def get_frame_rects(frames: list, transparency=None, loop=False):
+    # Smallest rectangle each frame has to redraw and the disposal method of each
+    # frame, for (h, w) palette index arrays of which no two consecutive ones are
+    # equal. The first frame always covers the canvas.
+    #
+    # A frame normally stays on screen (disposal 1) and the next one only draws
+    # the pixels that changed. Drawing can't make a pixel transparent again
+    # though, so when the next frame needs that the frame is cleared instead
+    # (disposal 2), its rectangle grown to take in every pixel to clear.
+    h, w = frames[0].shape
+    rects = [ (0, 0, w, h) ]
+    disposals = []
+
+    for i in range(1, len(frames) + bool(loop)):
+        # Past the end is the step back to the first frame of a looping gif
+        current = frames[i % len(frames)]
+        previous = frames[i - 1]
+        base = previous
+        disposal = 1
+
+        if transparency is not None:
+            cleared = get_bbox((current == transparency) & (previous != transparency))
+            if cleared:
+                disposal = 2
+                rects[i - 1] = get_union(rects[i - 1], cleared)
+                x, y, rect_w, rect_h = rects[i - 1]
+                base = previous.copy()
+                base[y:y + rect_h, x:x + rect_w] = transparency
+
+        disposals.append(disposal)
+        if i < len(frames):
+            # A frame has at least one pixel, even if nothing changed after clearing
+            rects.append(get_bbox(current != base) or (0, 0, 1, 1))
+
+    if not loop:
+        disposals.append(1)
+    return rects, disposals
+
+def write_gif(size: tuple, palette: list, frames: list, durations=None, disposal=0, loop=None, rects=None) -> bytes:
+    # frames are encode_frame() results, durations in ms. Frames cover the whole
+    # canvas unless there are rects, (x, y, w, h) for each frame. disposal is one
+    # method for every frame or a list of one per frame.
+    color_table, bits = get_color_table(palette)
+    transparency = get_transparency(palette)
+
+    f = BytesIO()
+    f.write(b'GIF89a')
+    f.write(struct.pack('<HHBBB', size[0], size[1], 0x80 | bits, 0, 0))
+    f.write(color_table)
+
+    if loop is not None:
+        f.write(b'!\xff\x0bNETSCAPE2.0\x03\x01' + struct.pack('<H', loop) + b'\x00')
+
+    for i, data in enumerate(frames):
+        duration = int(durations[i] / 10) if durations else 0
+        frame_disposal = disposal[i] if isinstance(disposal, list) else disposal
+
+        if transparency is not None or duration or frame_disposal:
+            flags = frame_disposal << 2 | (transparency is not None)
+            f.write(b'!\xf9\x04' + struct.pack('<BHB', flags, duration, transparency or 0) + b'\x00')
+
+        rect = rects[i] if rects else (0, 0) + tuple(size)
+        f.write(b',' + struct.pack('<HHHHB', *rect, 0))
+        f.write(data)
+
+    f.write(b';')
+    return f.getvalue()
@@ -1,70 +1,165 @@
-import customtkinter
+import time
+started = time.perf_counter()
+
+import argparse
+import logging
 import os
-import shutil
+import queue
+import sys
+import threading
 import traceback
-from PIL import ImageTk
-from zipfile import ZipFile
 
-import script
+import profiling
+
+# script and sinks, NumPy and Pillow are loaded by load_engine once the window
+# is up, customtkinter only when run as the app
+script = None
+sinks = None
+
+# The build runs on a worker thread. It reports back through progress_queue as
+# (kind, value) messages that poll_progress applies on the Tk thread.
+progress_queue = queue.Queue()
+cancel_event = threading.Event()
+build_thread = None
+
+# Sprite folder inputs read during the current build, see get_bundle
+bundles = {}
+
+# The sprite index of the current build, what get_dirs plans the stages with
+index = {}
+
+# Set by --profile, where to write the per step timings of each build
+profile_report = None
+
+# Set by --optimize-png, recompress the follow sprite and monster icon pngs
+optimize_png = False
+
+# Seconds from start until the window was up, reported with --profile
+window_shown = None
+
+def load_engine():
+    # Runs on its own thread while the window shows, the button is enabled when done
+    global script, sinks
+    import script
+    import sinks
+    # The lazily imported modules the first build would otherwise wait for
+    script.np.ndarray
+    script.Image.Image
+    progress_queue.put(('ready', time.perf_counter() - started))
+
+def on_window_shown():
+    # The first thing the event loop gets to, the window is up by now
+    global window_shown
+    window_shown = time.perf_counter() - started
+    threading.Thread(target=load_engine, daemon=True).start()
+    app.after(50, poll_progress)
 
 def set_icon():
     app.iconphoto(False, ImageTk.PhotoImage(file='resources/icon.png'))
 
-def remove_previous_sprites():
-    if os.path.exists('output'):
-        shutil.rmtree("output")
-
 def create_function():
-    no_checks = True
-    remove_previous_sprites()
-
-    front_sprites_bool = front_sprites_check_var.get()
-    back_sprites_bool = back_sprites_check_var.get()
-    overworld_sprites_bool = overworld_sprites_check_var.get()
-    icon_sprites_bool = icon_sprites_check_var.get()
-
-    if front_sprites_bool:
-        progress_label.configure(text='Creating Front Sprites')
-        front_sprites()
-        progress_label.configure(text='Done!')
-        no_checks = False
-
-    if back_sprites_bool:
-        progress_label.configure(text='Creating Back Sprites')
-        back_sprites()
-        progress_label.configure(text='Done!')
-        no_checks = False
-
-    if overworld_sprites_bool:
-        progress_label.configure(text='Creating Overworld Sprites')
-        overworld_sprites(mirror=mirror_overworld_sprites_check_var.get())
-        progress_label.configure(text='Done!')
-        no_checks = False
-    
-    if icon_sprites_bool:
-        progress_label.configure(text='Creating Monster Icons')
-        monster_icons(shiny=shiny_icon_sprites_check_var.get())
-        progress_label.configure(text='Done!')
-        no_checks = False
-
-    app.update()
-
-    if not no_checks:
-        progress_label.configure(text='Done!\nCreating Mod File')
-        with ZipFile('output/Revz Gen 2.zip', 'w') as zip_object:
-            for folder_name, sub_folders, file_names in os.walk('output/sprites'):
-                for filename in file_names:
-                    file_path = os.path.join(folder_name, filename)
-                    zip_object.write(file_path, file_path.split('/', 1)[1])
-                    app.update()
-
-            zip_object.write('resources/icon.png', 'icon.png')
-            zip_object.write('resources/info.xml', 'info.xml')
-
-        if os.path.exists('output/Revz Gen 2.zip'):
-            progress_label.configure(text='Done!\n`Revz Gen 2.zip` created')
+    global build_thread
+
+    # While a build is running the button cancels it
+    if build_thread and build_thread.is_alive():
+        cancel_event.set()
+        create_button.configure(text='Cancelling...', state=customtkinter.DISABLED)
+        return
+
+    options = {
+        'front': front_sprites_check_var.get(),
+        'back': back_sprites_check_var.get(),
+        'overworld': overworld_sprites_check_var.get(),
+        'mirror': mirror_overworld_sprites_check_var.get(),
+        'icons': icon_sprites_check_var.get(),
+        'shiny_icons': shiny_icon_sprites_check_var.get(),
+    }
+    if not (options['front'] or options['back'] or options['overworld'] or options['icons']):
+        return
+
+    cancel_event.clear()
+    build_thread = threading.Thread(target=build_mod, args=(options,), daemon=True)
+    build_thread.start()
+    create_button.configure(text='Cancel')
+    app.after(50, poll_progress)
+
+def poll_progress():
+    while True:
+        try:
+            kind, value = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+
+        if kind == 'label':
+            progress_label.configure(text=value)
+        elif kind == 'progress':
+            progressbar.set(value)
+        elif kind == 'done':
+            progress_label.configure(text=value)
+            create_button.configure(text='Create Mod', state=customtkinter.NORMAL)
+            return
+        elif kind == 'ready':
+            create_button.configure(text='Create Mod', state=customtkinter.NORMAL)
+            if profile_report:
+                print(f'Window shown after {window_shown * 1000:.0f}ms, engine loaded after {value * 1000:.0f}ms')
+            return
+
+    app.after(50, poll_progress)
+
+def build_mod(options: dict):
+    # Runs on the worker thread, must not touch any widget. Whatever happens it
+    # ends with a ('done', ...) message, or the button would stay on Cancel.
+    if profile_report:
+        profiling.enable()
+
+    result = 'Error while creating mod file. D:'
+    try:
+        # The mod file from the last build is updated, only what changed gets written
+        zip_sink = sinks.ZipSink('output/Revz Gen 2.zip')
+        sink = sinks.OptimizingSink(zip_sink, os.cpu_count()) if optimize_png else zip_sink
+
+        index.clear()
+        index.update(script.load_index())
+        script.save_index(index)
+
+        if options['front']:
+            progress_queue.put(('label', 'Creating Front Sprites'))
+            front_sprites(sink)
+
+        if options['back'] and not cancel_event.is_set():
+            progress_queue.put(('label', 'Creating Back Sprites'))
+            back_sprites(sink)
+
+        if options['overworld'] and not cancel_event.is_set():
+            progress_queue.put(('label', 'Creating Overworld Sprites'))
+            overworld_sprites(sink, mirror=options['mirror'])
+
+        if options['icons'] and not cancel_event.is_set():
+            progress_queue.put(('label', 'Creating Monster Icons'))
+            monster_icons(sink, shiny=options['shiny_icons'])
+
+        if cancel_event.is_set():
+            # Never closed, so the mod file stays as the last finished build left it
+            result = 'Cancelled'
         else:
-            progress_label.configure(text='Error while creating mod file. D:')
+            progress_queue.put(('label', 'Done!\nOptimizing and Creating Mod File' if optimize_png else 'Done!\nCreating Mod File'))
+            sinks.write_file(sink, 'icon.png', 'resources/icon.png')
+            sinks.write_file(sink, 'info.xml', 'resources/info.xml')
+            sink.close()
+            result = 'Done!\n`Revz Gen 2.zip` created'
+
+    except Exception:
+        traceback.print_exc()
+
+    finally:
+        bundles.clear()
+        if profile_report:
+            # A cancelled build has nothing worth reporting, but its timings must not carry over
+            if result != 'Cancelled':
+                profiling.write_report(profile_report)
+            profiling.disable()
+
+    progress_queue.put(('done', result))
 
 def icon_checkbox_function():
     if not icon_sprites_check_var.get():
@@ -83,85 +178,100 @@ def overworld_checkbox_function():
 def mirrored_checkbox_function():
     pass
 
-def front_sprites():
-    if not os.path.exists('output/sprites/battlesprites'):
-        os.makedirs('output/sprites/battlesprites')
+def get_dirs(stage: str):
+    # Only the folders the stage has something to make from
+    dirs = [ dir for dir, info in index.items() if script.has_inputs(info['files'], stage) ]
+    progress_queue.put(('progress', 0))
+    return dirs
 
-    dirs = [ f.name for f in os.scandir('./sprites') if f.is_dir() ]
-    progressbar._determinate_speed = 1 / len(dirs) * 50
-    progressbar.set(0)
+def report_progress(done: int, dirs: list):
+    progress_queue.put(('progress', done / len(dirs)))
+
+def front_sprites(sink):
+    dirs = get_dirs('front')
 
-    for dir in dirs:
-        app.update()
-        progressbar.step()
+    for i, dir in enumerate(dirs):
+        if cancel_event.is_set():
+            return
         
         try:
-            script.create_front_sprite(dir, 0, True)
+            script.create_front_sprite(dir, 0, True, sink=sink, bundle=get_bundle(dir))
             # print(f'Created front battle sprites for {dir.capitalize()}')
         except Exception:
             traceback.print_exc()
 
-def back_sprites():
-    if not os.path.exists('output/sprites/battlesprites'):
-        os.makedirs('output/sprites/battlesprites')
+        report_progress(i + 1, dirs)
 
-    dirs = [ f.name for f in os.scandir('./sprites') if f.is_dir() ]
-    progressbar._determinate_speed = 1 / len(dirs) * 50
-    progressbar.set(0)
+def back_sprites(sink):
+    dirs = get_dirs('back')
 
-    for dir in dirs:
-        app.update()
-        progressbar.step()
+    for i, dir in enumerate(dirs):
+        if cancel_event.is_set():
+            return
         
         try:
-            script.create_back_sprite(dir, 0, True)
+            script.create_back_sprite(dir, 0, True, sink=sink, bundle=get_bundle(dir))
             # print(f'Created back battle sprites for {dir.capitalize()}')
         except Exception:
             traceback.print_exc()
 
-def overworld_sprites(mirror=False):
-    if not os.path.exists('output/sprites/followsprites'):
-        os.makedirs('output/sprites/followsprites')
+        report_progress(i + 1, dirs)
 
-    dirs = [ f.name for f in os.scandir('./sprites') if f.is_dir() ]
-    progressbar._determinate_speed = 1 / len(dirs) * 50
-    progressbar.set(0)
+def get_bundle(dir: str):
+    # Every stage shares a folder's bundle, so shiny.pal is parsed and each image
+    # decoded once per build however many stages use it
+    if dir not in bundles:
+        bundles[dir] = script.SpriteBundle(dir, index[dir]['files'])
+    return bundles[dir]
+
+def overworld_sprites(sink, mirror=False):
+    dirs = get_dirs('overworld')
 
-    for dir in dirs:
-        app.update()
-        progressbar.step()
+    for i, dir in enumerate(dirs):
+        if cancel_event.is_set():
+            return
 
         try:
-            if dir in script.mirror_exclusions:
-                script.create_overworld_sprite(dir, False)
+            if not index[dir]['mirror']:
+                script.create_overworld_sprite(dir, False, sink=sink, bundle=get_bundle(dir))
             else:
-                script.create_overworld_sprite(dir, mirror=mirror)
+                script.create_overworld_sprite(dir, mirror=mirror, sink=sink, bundle=get_bundle(dir))
             # print(f'Created overworld sprites for {dir.capitalize()}')
         except Exception:
             traceback.print_exc()
+
+        report_progress(i + 1, dirs)
     
-    shutil.copyfile('resources/atlasdata.txt', 'output/sprites/followsprites/atlasdata.txt')
+    sinks.write_file(sink, 'sprites/followsprites/atlasdata.txt', 'resources/atlasdata.txt')
     print('Added atlas file for overworld sprites')
 
-def monster_icons(shiny=False):
-    if not os.path.exists('output/sprites/monstericons'):
-        os.makedirs('output/sprites/monstericons')
-
-    dirs = [ f.name for f in os.scandir('./sprites') if f.is_dir() ]
-    progressbar._determinate_speed = 1 / len(dirs) * 50
-    progressbar.set(0)
+def monster_icons(sink, shiny=False):
+    dirs = get_dirs('icon')
 
-    for dir in dirs:
-        app.update()
-        progressbar.step()
+    for i, dir in enumerate(dirs):
+        if cancel_event.is_set():
+            return
         
         try:
-            script.create_monster_icon(dir, shiny=shiny)
+            script.create_monster_icon(dir, shiny=shiny, sink=sink, bundle=get_bundle(dir))
             # print(f'Created monster icon for {dir.capitalize()}')
         except Exception:
             traceback.print_exc()
 
+        report_progress(i + 1, dirs)
+
 if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='Mod Creator')
+    parser.add_argument('--profile', nargs='?', const='profile.json', metavar='REPORT', help='time every step of every sprite and write a JSON report (default: profile.json)')
+    parser.add_argument('--optimize-png', action='store_true', help='losslessly shrink the follow sprite and monster icon pngs in the mod, slow but smaller')
+    args = parser.parse_args()
+    profile_report = args.profile
+    optimize_png = args.optimize_png
+
+    import customtkinter
+    from PIL import ImageTk
+
     customtkinter.set_appearance_mode("System")
     customtkinter.set_default_color_theme("blue")
 
@@ -201,7 +311,7 @@ if __name__ == '__main__':
     shiny_icon_sprites_checkbox = customtkinter.CTkCheckBox(app, text="Shiny Icons", variable=shiny_icon_sprites_check_var, onvalue=True, offvalue=False, corner_radius=7)
     shiny_icon_sprites_checkbox.place(relx=.3, rely=.61, anchor=customtkinter.W)
 
-    create_button = customtkinter.CTkButton(master=app, text="Create Mod", command=create_function, corner_radius=7)
+    create_button = customtkinter.CTkButton(master=app, text="Loading...", command=create_function, corner_radius=7, state=customtkinter.DISABLED)
     create_button.place(relx=.5, rely=.75, anchor=customtkinter.CENTER)
 
     progressbar = customtkinter.CTkProgressBar(app, orientation="horizontal", mode='determinate')
@@ -211,4 +321,6 @@ if __name__ == '__main__':
     progress_label = customtkinter.CTkLabel(master=app, text='')
     progress_label.place(relx=.5, rely=.92, anchor=customtkinter.CENTER)
 
+    app.after(1, on_window_shown)
+
     app.mainloop()
\ No newline at end of file
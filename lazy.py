@@ -0,0 +1,23 @@
+import importlib.util
+import sys
+
+# NumPy and Pillow take most of the time it takes to import the converter, and
+# plenty of runs (--help, a build with nothing to do, the GUI until a build
+# starts) never touch them:
+#
+#   np = lazy_import('numpy')
+#
+# returns the module right away but only runs it on the first attribute access.
+# Annotations would count as one, modules using this import annotations from
+# __future__ so they stay strings.
+
+def lazy_import(name: str):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+import traceback
+
+# Runs a build as three overlapping stages:
+#
+#   read(item)              prefetch thread, loads the inputs of the next items
+#   compute(item, data)     calling thread, returns (result, output)
+#   write(output)           write-behind thread, gets the outputs in item order
+#
+# The queues between them hold at most depth items, which caps how much decoded
+# input and encoded output can pile up when one stage is slower than the others.
+
+class Stage:
+    def __init__(self, name: str):
+        self.name = name
+        self.busy = 0.0
+
+class Depth:
+    # Queue length seen by the consumer every time it takes an item
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.total = 0
+        self.samples = 0
+        self.max = 0
+
+    def sample(self, q: queue.Queue):
+        depth = q.qsize()
+        self.total += depth
+        self.samples += 1
+        self.max = max(self.max, depth)
+
+    def __str__(self):
+        return f'{self.name} queue {self.total / (self.samples or 1):.1f}/{self.size} avg {self.max} max'
+
+def run(items: list, read, compute, write, depth=8) -> list:
+    read_queue = queue.Queue(depth)
+    write_queue = queue.Queue(depth)
+    stages = { name: Stage(name) for name in ('read', 'compute', 'write') }
+    depths = [ Depth('read', depth), Depth('write', depth) ]
+    errors = []
+    start = time.perf_counter()
+
+    def reader():
+        for item in items:
+            stage_start = time.perf_counter()
+            try:
+                data = read(item)
+            except Exception:
+                # compute gets None and does the reading itself
+                traceback.print_exc()
+                data = None
+            stages['read'].busy += time.perf_counter() - stage_start
+            read_queue.put(data)
+
+    def writer():
+        while True:
+            depths[1].sample(write_queue)
+            output = write_queue.get()
+            if output is None:
+                return
+            stage_start = time.perf_counter()
+            try:
+                write(output)
+            except Exception as e:
+                # Keep draining so compute never blocks on a full queue
+                errors.append(e)
+            stages['write'].busy += time.perf_counter() - stage_start
+
+    threads = [ threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True) ]
+    for thread in threads:
+        thread.start()
+
+    results = []
+    try:
+        for item in items:
+            depths[0].sample(read_queue)
+            data = read_queue.get()
+            stage_start = time.perf_counter()
+            result, output = compute(item, data)
+            stages['compute'].busy += time.perf_counter() - stage_start
+            results.append(result)
+            write_queue.put(output)
+    finally:
+        write_queue.put(None)
+        threads[1].join()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - start
+    utilization = ', '.join(f'{stage.name} {stage.busy / (elapsed or 1) * 100:.0f}%' for stage in stages.values())
+    print(f'Pipeline: {len(items)} items in {elapsed:.2f}s, busy {utilization}, {", ".join(str(d) for d in depths)}')
+    return results
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from io import BytesIO
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+Image = lazy_import('PIL.Image')
+
+# Lossless re-encoding of PNGs. Every way of storing the pixels that fits
+# (palette at the smallest bit depth, gray, RGB, RGBA) is tried with every row
+# filter and a few zlib levels and strategies, and the smallest file wins:
+#
+#   data = optimize_png(data)
+#
+# The result is decoded again and only used if it gives exactly the same RGBA
+# pixels and is smaller than what came in, otherwise the input is returned.
+
+FILTERS = [ 0, 1, 2, 3, 4, 'adaptive' ]
+LEVELS = [ 9, 6 ]
+STRATEGIES = [ zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED ]
+
+def optimize_png(data: bytes) -> bytes:
+    image = Image.open(BytesIO(data))
+    pixels = np.array(image.convert('RGBA'))
+
+    best = data
+    for color_type, bit_depth, rows, chunks in get_encodings(pixels):
+        for filtered in get_filtered_rows(rows, bit_depth, color_type):
+            for level in LEVELS:
+                for strategy in STRATEGIES:
+                    compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+                    idat = compressor.compress(filtered) + compressor.flush()
+                    # Only put together the png that would actually be smaller
+                    if get_png_size(chunks, idat) < len(best):
+                        best = get_png(pixels.shape[1], pixels.shape[0], bit_depth, color_type, chunks, idat)
+
+    if best is not data and not is_identical(best, pixels):
+        return data
+    return best
+
+def is_identical(data: bytes, pixels: np.ndarray) -> bool:
+    image = Image.open(BytesIO(data))
+    return np.array_equal(np.array(image.convert('RGBA')), pixels)
+
+def get_png(width: int, height: int, bit_depth: int, color_type: int, chunks: list, idat: bytes) -> bytes:
+    f = BytesIO()
+    f.write(b'\x89PNG\r\n\x1a\n')
+    write_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0))
+    for name, chunk in chunks:
+        write_chunk(f, name, chunk)
+    write_chunk(f, b'IDAT', idat)
+    write_chunk(f, b'IEND', b'')
+    return f.getvalue()
+
+def get_png_size(chunks: list, idat: bytes) -> int:
+    # What get_png will make: the signature, then every chunk is its data plus 12
+    # bytes of length, name and crc, IHDR always has 13 bytes of data and IEND none
+    return 8 + (12 + 13) + sum(12 + len(chunk) for name, chunk in chunks) + (12 + len(idat)) + 12
+
+def write_chunk(f, name: bytes, data: bytes):
+    f.write(struct.pack('>I', len(data)) + name + data + struct.pack('>I', zlib.crc32(name + data)))
+
+def get_encodings(pixels: np.ndarray):
+    # (color type, bit depth, (h, row bytes) array, extra chunks) for every way the
+    # pixels can be stored without losing anything
+    h, w = pixels.shape[:2]
+    opaque = bool((pixels[..., 3] == 255).all())
+    gray = bool((pixels[..., 0] == pixels[..., 1]).all() and (pixels[..., 1] == pixels[..., 2]).all())
+
+    colors, counts = np.unique(pixels.reshape(-1, 4).view('>u4')[:, 0], return_counts=True)
+    if len(colors) <= 256:
+        # Translucent entries first so tRNS stays short, then the most used ones
+        rgba = colors.astype('>u4').view(np.uint8).reshape(-1, 4)
+        order = np.lexsort((-counts, rgba[:, 3] == 255))
+        palette = rgba[order]
+        lookup = np.empty(len(colors), dtype=np.uint8)
+        lookup[order] = np.arange(len(colors), dtype=np.uint8)
+        indices = lookup[np.searchsorted(colors, pixels.view('>u4')[..., 0])]
+
+        chunks = [ (b'PLTE', palette[:, :3].tobytes()) ]
+        translucent = int((palette[:, 3] != 255).sum())
+        if translucent:
+            chunks.append((b'tRNS', palette[:translucent, 3].tobytes()))
+
+        bit_depth = next(bits for bits in (1, 2, 4, 8) if len(colors) <= 1 << bits)
+        for bits in sorted({ bit_depth, 8 }):
+            yield 3, bits, pack_rows(indices, bits), chunks
+
+    if gray and opaque:
+        yield 0, 8, pixels[..., 0], []
+    elif gray:
+        yield 4, 8, pixels[..., [0, 3]].reshape(h, w * 2), []
+    if len(colors) > 256:
+        if opaque:
+            yield 2, 8, pixels[..., :3].reshape(h, w * 3), []
+        yield 6, 8, pixels.reshape(h, w * 4), []
+
+def pack_rows(indices: np.ndarray, bits: int) -> np.ndarray:
+    # Several pixels per byte below 8 bits, first pixel in the high bits
+    if bits == 8:
+        return indices
+    h, w = indices.shape
+    per_byte = 8 // bits
+    padded = np.zeros((h, -(-w // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :w] = indices
+    groups = padded.reshape(h, -1, per_byte)
+    shifts = np.arange(8 - bits, -1, -bits, dtype=np.uint8)
+    return np.bitwise_or.reduce(groups << shifts, axis=2).astype(np.uint8)
+
+def get_filtered_rows(rows: np.ndarray, bit_depth: int, color_type: int):
+    # The scanlines with a filter type byte in front, for each of FILTERS
+    channels = { 0: 1, 2: 3, 3: 1, 4: 2, 6: 4 }[color_type]
+    bpp = max(bit_depth * channels // 8, 1)
+
+    raw = rows.astype(np.int16)
+    left = np.zeros_like(raw)
+    left[:, bpp:] = raw[:, :-bpp]
+    up = np.zeros_like(raw)
+    up[1:] = raw[:-1]
+    up_left = np.zeros_like(raw)
+    up_left[1:, bpp:] = raw[:-1, :-bpp]
+
+    p = left + up - up_left
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - up_left)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+
+    filtered = [
+        raw,
+        raw - left,
+        raw - up,
+        raw - ((left + up) >> 1),
+        raw - paeth,
+    ]
+    filtered = [ (values % 256).astype(np.uint8) for values in filtered ]
+
+    for kind in FILTERS:
+        if kind == 'adaptive':
+            # Per row the filter with the smallest sum of signed magnitudes
+            costs = np.stack([ np.abs(values.view(np.int8).astype(np.int32)).sum(axis=1) for values in filtered ])
+            types = costs.argmin(axis=0)
+            chosen = np.stack(filtered)[types, np.arange(len(types))]
+        else:
+            types = np.full(len(raw), kind)
+            chosen = filtered[kind]
+        yield np.hstack([ types.astype(np.uint8)[:, None], chosen ]).tobytes()
@@ -0,0 +1,86 @@
+import json
+import time
+
+# Opt-in timing of each step of the create_* functions, per sprite folder.
+# Off by default, get_timer() then hands out a timer that does nothing.
+#
+#   timer = profiling.get_timer(directory, 'front')
+#   ...decode...
+#   timer.lap('decode')
+#
+# records the time since the previous lap as timings[directory]['front.decode'].
+
+timings = None
+
+def enable():
+    global timings
+    timings = {}
+
+def disable():
+    global timings
+    timings = None
+
+class Timer:
+    def __init__(self, directory: str, function: str):
+        self.stages = timings.setdefault(directory, {})
+        self.function = function
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        key = f'{self.function}.{stage}'
+        self.stages[key] = self.stages.get(key, 0.0) + now - self.last
+        self.last = now
+
+class NullTimer:
+    def lap(self, stage: str):
+        pass
+
+null_timer = NullTimer()
+
+def get_timer(directory: str, function: str):
+    return Timer(directory, function) if timings is not None else null_timer
+
+def pop_timings(directory: str) -> dict:
+    # Hands one folder's timings over, worker processes send them back to the parent
+    return timings.pop(directory, {}) if timings is not None else {}
+
+def merge_timings(directory: str, stages: dict):
+    if timings is not None:
+        merged = timings.setdefault(directory, {})
+        for key, seconds in stages.items():
+            merged[key] = merged.get(key, 0.0) + seconds
+
+def get_report(top=10) -> dict:
+    stages = {}
+    species = {}
+    steps = []
+    for directory, stage_times in timings.items():
+        species[directory] = sum(stage_times.values())
+        for key, seconds in stage_times.items():
+            stages[key] = stages.get(key, 0.0) + seconds
+            steps.append({ 'species': directory, 'stage': key, 'seconds': seconds })
+
+    return {
+        'total': sum(species.values()),
+        'stages': dict(sorted(stages.items(), key=lambda item: item[1], reverse=True)),
+        'slowest_species': [ { 'species': directory, 'seconds': seconds } for directory, seconds in sorted(species.items(), key=lambda item: item[1], reverse=True)[:top] ],
+        'slowest_steps': sorted(steps, key=lambda step: step['seconds'], reverse=True)[:top],
+        'species': timings,
+    }
+
+def write_report(file_path: str, top=10):
+    report = get_report(top)
+    with open(file_path, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    print(f'\nProfiled {len(timings)} folders, {report["total"]:.2f}s in create_* functions')
+    for key, seconds in report['stages'].items():
+        print(f'  {key:<22}{seconds:>8.3f}s {seconds / (report["total"] or 1) * 100:>5.1f}%')
+    print('Slowest folders:')
+    for entry in report['slowest_species']:
+        print(f'  {entry["species"]:<22}{entry["seconds"]:>8.3f}s')
+    print('Slowest steps:')
+    for entry in report['slowest_steps']:
+        print(f'  {entry["species"]:<22}{entry["stage"]:<22}{entry["seconds"]:>8.3f}s')
+    print(f'Wrote {file_path}')
@@ -0,0 +1,573 @@
+# Tables that came with pokedex.py but nothing in the converter uses. They
+# live here so importing the pokedex for a build doesn't execute them.
+
+move_to_type = {
+    'Pound': 'Normal',
+    'Karate Chop': 'Fighting',
+    'Double Slap': 'Normal',
+    'Comet Punch': 'Normal',
+    'Mega Punch': 'Normal',
+    'Pay Day': 'Normal',
+    'Fire Punch': 'Fire',
+    'Ice Punch': 'Ice',
+    'Thunder Punch': 'Electric',
+    'Scratch': 'Normal',
+    'Vise Grip': 'Normal',
+    'Guillotine': 'Normal',
+    'Razor Wind': 'Normal',
+    'Swords Dance': 'Normal',
+    'Cut': 'Normal',
+    'Gust': 'Flying',
+    'Wing Attack': 'Flying',
+    'Whirlwind': 'Normal',
+    'Fly': 'Flying',
+    'Bind': 'Normal',
+    'Slam': 'Normal',
+    'Vine Whip': 'Grass',
+    'Stomp': 'Normal',
+    'Double Kick': 'Fighting',
+    'Mega Kick': 'Normal',
+    'Jump Kick': 'Fighting',
+    'Rolling Kick': 'Fighting',
+    'Sand Attack': 'Ground',
+    'Headbutt': 'Normal',
+    'Horn Attack': 'Normal',
+    'Fury Attack': 'Normal',
+    'Horn Drill': 'Normal',
+    'Tackle': 'Normal',
+    'Body Slam': 'Normal',
+    'Wrap': 'Normal',
+    'Take Down': 'Normal',
+    'Thrash': 'Normal',
+    'Double-Edge': 'Normal',
+    'Tail Whip': 'Normal',
+    'Poison Sting': 'Poison',
+    'Twineedle': 'Bug',
+    'Pin Missile': 'Bug',
+    'Leer': 'Normal',
+    'Bite': 'Dark',
+    'Growl': 'Normal',
+    'Roar': 'Normal',
+    'Sing': 'Normal',
+    'Supersonic': 'Normal',
+    'Sonic Boom': 'Normal',
+    'Disable': 'Normal',
+    'Acid': 'Poison',
+    'Ember': 'Fire',
+    'Flamethrower': 'Fire',
+    'Mist': 'Ice',
+    'Water Gun': 'Water',
+    'Hydro Pump': 'Water',
+    'Surf': 'Water',
+    'Ice Beam': 'Ice',
+    'Blizzard': 'Ice',
+    'Psybeam': 'Psychic',
+    'Bubble Beam': 'Water',
+    'Aurora Beam': 'Ice',
+    'Hyper Beam': 'Normal',
+    'Peck': 'Flying',
+    'Drill Peck': 'Flying',
+    'Submission': 'Fighting',
+    'Low Kick': 'Fighting',
+    'Counter': 'Fighting',
+    'Seismic Toss': 'Fighting',
+    'Strength': 'Normal',
+    'Absorb': 'Grass',
+    'Mega Drain': 'Grass',
+    'Leech Seed': 'Grass',
+    'Growth': 'Normal',
+    'Razor Leaf': 'Grass',
+    'Solar Beam': 'Grass',
+    'Poison Powder': 'Poison',
+    'Stun Spore': 'Grass',
+    'Sleep Powder': 'Grass',
+    'Petal Dance': 'Grass',
+    'String Shot': 'Bug',
+    'Dragon Rage': 'Dragon',
+    'Fire Spin': 'Fire',
+    'Thunder Shock': 'Electric',
+    'Thunderbolt': 'Electric',
+    'Thunder Wave': 'Electric',
+    'Thunder': 'Electric',
+    'Rock Throw': 'Rock',
+    'Earthquake': 'Ground',
+    'Fissure': 'Ground',
+    'Dig': 'Ground',
+    'Toxic': 'Poison',
+    'Confusion': 'Psychic',
+    'Psychic': 'Psychic',
+    'Hypnosis': 'Psychic',
+    'Meditate': 'Psychic',
+    'Agility': 'Psychic',
+    'Quick Attack': 'Normal',
+    'Rage': 'Normal',
+    'Teleport': 'Psychic',
+    'Night Shade': 'Ghost',
+    'Mimic': 'Normal',
+    'Screech': 'Normal',
+    'Double Team': 'Normal',
+    'Recover': 'Normal',
+    'Harden': 'Normal',
+    'Minimize': 'Normal',
+    'Smokescreen': 'Normal',
+    'Confuse Ray': 'Ghost',
+    'Withdraw': 'Water',
+    'Defense Curl': 'Normal',
+    'Barrier': 'Psychic',
+    'Light Screen': 'Psychic',
+    'Haze': 'Ice',
+    'Reflect': 'Psychic',
+    'Focus Energy': 'Normal',
+    'Bide': 'Normal',
+    'Metronome': 'Normal',
+    'Mirror Move': 'Flying',
+    'Self-Destruct': 'Normal',
+    'Egg Bomb': 'Normal',
+    'Lick': 'Ghost',
+    'Smog': 'Poison',
+    'Sludge': 'Poison',
+    'Bone Club': 'Ground',
+    'Fire Blast': 'Fire',
+    'Waterfall': 'Water',
+    'Clamp': 'Water',
+    'Swift': 'Normal',
+    'Skull Bash': 'Normal',
+    'Spike Cannon': 'Normal',
+    'Constrict': 'Normal',
+    'Amnesia': 'Psychic',
+    'Kinesis': 'Psychic',
+    'Soft-Boiled': 'Normal',
+    'High Jump Kick': 'Fighting',
+    'Glare': 'Normal',
+    'Dream Eater': 'Psychic',
+    'Poison Gas': 'Poison',
+    'Barrage': 'Normal',
+    'Leech Life': 'Bug',
+    'Lovely Kiss': 'Normal',
+    'Sky Attack': 'Flying',
+    'Transform': 'Normal',
+    'Bubble': 'Water',
+    'Dizzy Punch': 'Normal',
+    'Spore': 'Grass',
+    'Flash': 'Normal',
+    'Psywave': 'Psychic',
+    'Splash': 'Normal',
+    'Acid Armor': 'Poison',
+    'Crabhammer': 'Water',
+    'Explosion': 'Normal',
+    'Fury Swipes': 'Normal',
+    'Bonemerang': 'Ground',
+    'Rest': 'Psychic',
+    'Rock Slide': 'Rock',
+    'Hyper Fang': 'Normal',
+    'Sharpen': 'Normal',
+    'Conversion': 'Normal',
+    'Tri Attack': 'Normal',
+    'Super Fang': 'Normal',
+    'Slash': 'Normal',
+    'Substitute': 'Normal',
+    'Struggle': 'Normal',
+    'Sketch': 'Normal',
+    'Triple Kick': 'Fighting',
+    'Thief': 'Dark',
+    'Spider Web': 'Bug',
+    'Mind Reader': 'Normal',
+    'Nightmare': 'Ghost',
+    'Flame Wheel': 'Fire',
+    'Snore': 'Normal',
+    'Curse': 'Ghost',
+    'Flail': 'Normal',
+    'Conversion 2': 'Normal',
+    'Aeroblast': 'Flying',
+    'Cotton Spore': 'Grass',
+    'Reversal': 'Fighting',
+    'Spite': 'Ghost',
+    'Powder Snow': 'Ice',
+    'Protect': 'Normal',
+    'Mach Punch': 'Fighting',
+    'Scary Face': 'Normal',
+    'Feint Attack': 'Dark',
+    'Sweet Kiss': 'Normal',
+    'Belly Drum': 'Normal',
+    'Sludge Bomb': 'Poison',
+    'Mud-Slap': 'Ground',
+    'Octazooka': 'Water',
+    'Spikes': 'Ground',
+    'Zap Cannon': 'Electric',
+    'Foresight': 'Normal',
+    'Destiny Bond': 'Ghost',
+    'Perish Song': 'Normal',
+    'Icy Wind': 'Ice',
+    'Detect': 'Fighting',
+    'Bone Rush': 'Ground',
+    'Lock-On': 'Normal',
+    'Outrage': 'Dragon',
+    'Sandstorm': 'Rock',
+    'Giga Drain': 'Grass',
+    'Endure': 'Normal',
+    'Charm': 'Normal',
+    'Rollout': 'Rock',
+    'False Swipe': 'Normal',
+    'Swagger': 'Normal',
+    'Milk Drink': 'Normal',
+    'Spark': 'Electric',
+    'Fury Cutter': 'Bug',
+    'Steel Wing': 'Steel',
+    'Mean Look': 'Normal',
+    'Attract': 'Normal',
+    'Sleep Talk': 'Normal',
+    'Heal Bell': 'Normal',
+    'Return': 'Normal',
+    'Present': 'Normal',
+    'Frustration': 'Normal',
+    'Safeguard': 'Normal',
+    'Pain Split': 'Normal',
+    'Sacred Fire': 'Fire',
+    'Magnitude': 'Ground',
+    'Dynamic Punch': 'Fighting',
+    'Megahorn': 'Bug',
+    'Dragon Breath': 'Dragon',
+    'Baton Pass': 'Normal',
+    'Encore': 'Normal',
+    'Pursuit': 'Dark',
+    'Rapid Spin': 'Normal',
+    'Sweet Scent': 'Normal',
+    'Iron Tail': 'Steel',
+    'Metal Claw': 'Steel',
+    'Vital Throw': 'Fighting',
+    'Morning Sun': 'Normal',
+    'Synthesis': 'Grass',
+    'Moonlight': 'Normal',
+    'Hidden Power': 'Normal',
+    'Cross Chop': 'Fighting',
+    'Twister': 'Dragon',
+    'Rain Dance': 'Water',
+    'Sunny Day': 'Fire',
+    'Crunch': 'Dark',
+    'Mirror Coat': 'Psychic',
+    'Psych Up': 'Normal',
+    'Extreme Speed': 'Normal',
+    'Ancient Power': 'Rock',
+    'Shadow Ball': 'Ghost',
+    'Future Sight': 'Psychic',
+    'Rock Smash': 'Fighting',
+    'Whirlpool': 'Water',
+    'Beat Up': 'Dark',
+    'Fake Out': 'Normal',
+    'Uproar': 'Normal',
+    'Stockpile': 'Normal',
+    'Spit Up': 'Normal',
+    'Swallow': 'Normal',
+    'Heat Wave': 'Fire',
+    'Hail': 'Ice',
+    'Torment': 'Dark',
+    'Flatter': 'Dark',
+    'Will-O-Wisp': 'Fire',
+    'Memento': 'Dark',
+    'Facade': 'Normal',
+    'Focus Punch': 'Fighting',
+    'Smelling Salts': 'Normal',
+    'Follow Me': 'Normal',
+    'Nature Power': 'Normal',
+    'Charge': 'Electric',
+    'Taunt': 'Dark',
+    'Helping Hand': 'Normal',
+    'Trick': 'Psychic',
+    'Role Play': 'Psychic',
+    'Wish': 'Normal',
+    'Assist': 'Normal',
+    'Ingrain': 'Grass',
+    'Superpower': 'Fighting',
+    'Magic Coat': 'Psychic',
+    'Recycle': 'Normal',
+    'Revenge': 'Fighting',
+    'Brick Break': 'Fighting',
+    'Yawn': 'Normal',
+    'Knock Off': 'Dark',
+    'Endeavor': 'Normal',
+    'Eruption': 'Fire',
+    'Skill Swap': 'Psychic',
+    'Imprison': 'Psychic',
+    'Refresh': 'Normal',
+    'Grudge': 'Ghost',
+    'Snatch': 'Dark',
+    'Secret Power': 'Normal',
+    'Dive': 'Water',
+    'Arm Thrust': 'Fighting',
+    'Camouflage': 'Normal',
+    'Tail Glow': 'Bug',
+    'Luster Purge': 'Psychic',
+    'Mist Ball': 'Psychic',
+    'Feather Dance': 'Flying',
+    'Teeter Dance': 'Normal',
+    'Blaze Kick': 'Fire',
+    'Mud Sport': 'Ground',
+    'Ice Ball': 'Ice',
+    'Needle Arm': 'Grass',
+    'Slack Off': 'Normal',
+    'Hyper Voice': 'Normal',
+    'Poison Fang': 'Poison',
+    'Crush Claw': 'Normal',
+    'Blast Burn': 'Fire',
+    'Hydro Cannon': 'Water',
+    'Meteor Mash': 'Steel',
+    'Astonish': 'Ghost',
+    'Weather Ball': 'Normal',
+    'Aromatherapy': 'Grass',
+    'Fake Tears': 'Dark',
+    'Air Cutter': 'Flying',
+    'Overheat': 'Fire',
+    'Odor Sleuth': 'Normal',
+    'Rock Tomb': 'Rock',
+    'Silver Wind': 'Bug',
+    'Metal Sound': 'Steel',
+    'Grass Whistle': 'Grass',
+    'Tickle': 'Normal',
+    'Cosmic Power': 'Psychic',
+    'Water Spout': 'Water',
+    'Signal Beam': 'Bug',
+    'Shadow Punch': 'Ghost',
+    'Extrasensory': 'Psychic',
+    'Sky Uppercut': 'Fighting',
+    'Sand Tomb': 'Ground',
+    'Sheer Cold': 'Ice',
+    'Muddy Water': 'Water',
+    'Bullet Seed': 'Grass',
+    'Aerial Ace': 'Flying',
+    'Icicle Spear': 'Ice',
+    'Iron Defense': 'Steel',
+    'Block': 'Normal',
+    'Howl': 'Normal',
+    'Dragon Claw': 'Dragon',
+    'Frenzy Plant': 'Grass',
+    'Bulk Up': 'Fighting',
+    'Bounce': 'Flying',
+    'Mud Shot': 'Ground',
+    'Poison Tail': 'Poison',
+    'Covet': 'Normal',
+    'Volt Tackle': 'Electric',
+    'Magical Leaf': 'Grass',
+    'Water Sport': 'Water',
+    'Calm Mind': 'Psychic',
+    'Leaf Blade': 'Grass',
+    'Dragon Dance': 'Dragon',
+    'Rock Blast': 'Rock',
+    'Shock Wave': 'Electric',
+    'Water Pulse': 'Water',
+    'Doom Desire': 'Steel',
+    'Psycho Boost': 'Psychic',
+    'Roost': 'Flying',
+    'Gravity': 'Psychic',
+    'Miracle Eye': 'Psychic',
+    'Wake-Up Slap': 'Fighting',
+    'Hammer Arm': 'Fighting',
+    'Gyro Ball': 'Steel',
+    'Healing Wish': 'Psychic',
+    'Brine': 'Water',
+    'Natural Gift': 'Normal',
+    'Feint': 'Normal',
+    'Pluck': 'Flying',
+    'Tailwind': 'Flying',
+    'Acupressure': 'Normal',
+    'Metal Burst': 'Steel',
+    'U-turn': 'Bug',
+    'Close Combat': 'Fighting',
+    'Payback': 'Dark',
+    'Assurance': 'Dark',
+    'Embargo': 'Dark',
+    'Fling': 'Dark',
+    'Psycho Shift': 'Psychic',
+    'Trump Card': 'Normal',
+    'Heal Block': 'Psychic',
+    'Wring Out': 'Normal',
+    'Power Trick': 'Psychic',
+    'Gastro Acid': 'Poison',
+    'Lucky Chant': 'Normal',
+    'Me First': 'Normal',
+    'Copycat': 'Normal',
+    'Power Swap': 'Psychic',
+    'Guard Swap': 'Psychic',
+    'Punishment': 'Dark',
+    'Last Resort': 'Normal',
+    'Worry Seed': 'Grass',
+    'Sucker Punch': 'Dark',
+    'Toxic Spikes': 'Poison',
+    'Heart Swap': 'Psychic',
+    'Aqua Ring': 'Water',
+    'Magnet Rise': 'Electric',
+    'Flare Blitz': 'Fire',
+    'Force Palm': 'Fighting',
+    'Aura Sphere': 'Fighting',
+    'Rock Polish': 'Rock',
+    'Poison Jab': 'Poison',
+    'Dark Pulse': 'Dark',
+    'Night Slash': 'Dark',
+    'Aqua Tail': 'Water',
+    'Seed Bomb': 'Grass',
+    'Air Slash': 'Flying',
+    'X-Scissor': 'Bug',
+    'Bug Buzz': 'Bug',
+    'Dragon Pulse': 'Dragon',
+    'Dragon Rush': 'Dragon',
+    'Power Gem': 'Rock',
+    'Drain Punch': 'Fighting',
+    'Vacuum Wave': 'Fighting',
+    'Focus Blast': 'Fighting',
+    'Energy Ball': 'Grass',
+    'Brave Bird': 'Flying',
+    'Earth Power': 'Ground',
+    'Switcheroo': 'Dark',
+    'Giga Impact': 'Normal',
+    'Nasty Plot': 'Dark',
+    'Bullet Punch': 'Steel',
+    'Avalanche': 'Ice',
+    'Ice Shard': 'Ice',
+    'Shadow Claw': 'Ghost',
+    'Thunder Fang': 'Electric',
+    'Ice Fang': 'Ice',
+    'Fire Fang': 'Fire',
+    'Shadow Sneak': 'Ghost',
+    'Mud Bomb': 'Ground',
+    'Psycho Cut': 'Psychic',
+    'Zen Headbutt': 'Psychic',
+    'Mirror Shot': 'Steel',
+    'Flash Cannon': 'Steel',
+    'Rock Climb': 'Normal',
+    'Defog': 'Flying',
+    'Trick Room': 'Psychic',
+    'Draco Meteor': 'Dragon',
+    'Discharge': 'Electric',
+    'Lava Plume': 'Fire',
+    'Leaf Storm': 'Grass',
+    'Power Whip': 'Grass',
+    'Rock Wrecker': 'Rock',
+    'Cross Poison': 'Poison',
+    'Gunk Shot': 'Poison',
+    'Iron Head': 'Steel',
+    'Magnet Bomb': 'Steel',
+    'Stone Edge': 'Rock',
+    'Captivate': 'Normal',
+    'Stealth Rock': 'Rock',
+    'Grass Knot': 'Grass',
+    'Chatter': 'Flying',
+    'Judgment': 'Normal',
+    'Bug Bite': 'Bug',
+    'Charge Beam': 'Electric',
+    'Wood Hammer': 'Grass',
+    'Aqua Jet': 'Water',
+    'Attack Order': 'Bug',
+    'Defend Order': 'Bug',
+    'Heal Order': 'Bug',
+    'Head Smash': 'Rock',
+    'Double Hit': 'Normal',
+    'Roar of Time': 'Dragon',
+    'Spacial Rend': 'Dragon',
+    'Lunar Dance': 'Psychic',
+    'Crush Grip': 'Normal',
+    'Magma Storm': 'Fire',
+    'Dark Void': 'Dark',
+    'Seed Flare': 'Grass',
+    'Ominous Wind': 'Ghost',
+    'Shadow Force': 'Ghost',
+    'Hone Claws': 'Dark',
+    'Wide Guard': 'Rock',
+    'Guard Split': 'Psychic',
+    'Power Split': 'Psychic',
+    'Wonder Room': 'Psychic',
+    'Psyshock': 'Psychic',
+    'Venoshock': 'Poison',
+    'Autotomize': 'Steel',
+    'Rage Powder': 'Bug',
+    'Telekinesis': 'Psychic',
+    'Magic Room': 'Psychic',
+    'Smack Down': 'Rock',
+    'Storm Throw': 'Fighting',
+    'Flame Burst': 'Fire',
+    'Sludge Wave': 'Poison',
+    'Quiver Dance': 'Bug',
+    'Heavy Slam': 'Steel',
+    'Synchronoise': 'Psychic',
+    'Electro Ball': 'Electric',
+    'Soak': 'Water',
+    'Flame Charge': 'Fire',
+    'Coil': 'Poison',
+    'Low Sweep': 'Fighting',
+    'Acid Spray': 'Poison',
+    'Foul Play': 'Dark',
+    'Simple Beam': 'Normal',
+    'Entrainment': 'Normal',
+    'After You': 'Normal',
+    'Round': 'Normal',
+    'Echoed Voice': 'Normal',
+    'Chip Away': 'Normal',
+    'Clear Smog': 'Poison',
+    'Stored Power': 'Psychic',
+    'Quick Guard': 'Fighting',
+    'Ally Switch': 'Psychic',
+    'Scald': 'Water',
+    'Shell Smash': 'Normal',
+    'Heal Pulse': 'Psychic',
+    'Hex': 'Ghost',
+    'Sky Drop': 'Flying',
+    'Shift Gear': 'Steel',
+    'Circle Throw': 'Fighting',
+    'Incinerate': 'Fire',
+    'Quash': 'Dark',
+    'Acrobatics': 'Flying',
+    'Reflect Type': 'Normal',
+    'Retaliate': 'Normal',
+    'Final Gambit': 'Fighting',
+    'Bestow': 'Normal',
+    'Inferno': 'Fire',
+    'Water Pledge': 'Water',
+    'Fire Pledge': 'Fire',
+    'Grass Pledge': 'Grass',
+    'Volt Switch': 'Electric',
+    'Struggle Bug': 'Bug',
+    'Bulldoze': 'Ground',
+    'Frost Breath': 'Ice',
+    'Dragon Tail': 'Dragon',
+    'Work Up': 'Normal',
+    'Electroweb': 'Electric',
+    'Wild Charge': 'Electric',
+    'Drill Run': 'Ground',
+    'Dual Chop': 'Dragon',
+    'Heart Stamp': 'Psychic',
+    'Horn Leech': 'Grass',
+    'Sacred Sword': 'Fighting',
+    'Razor Shell': 'Water',
+    'Heat Crash': 'Fire',
+    'Leaf Tornado': 'Grass',
+    'Steamroller': 'Bug',
+    'Cotton Guard': 'Grass',
+    'Night Daze': 'Dark',
+    'Psystrike': 'Psychic',
+    'Tail Slap': 'Normal',
+    'Hurricane': 'Flying',
+    'Head Charge': 'Normal',
+    'Gear Grind': 'Steel',
+    'Searing Shot': 'Fire',
+    'Techno Blast': 'Normal',
+    'Relic Song': 'Normal',
+    'Secret Sword': 'Fighting',
+    'Glaciate': 'Ice',
+    'Bolt Strike': 'Electric',
+    'Blue Flare': 'Fire',
+    'Fiery Dance': 'Fire',
+    'Freeze Shock': 'Ice',
+    'Ice Burn': 'Ice',
+    'Snarl': 'Dark',
+    'Icicle Crash': 'Ice',
+    'V-create': 'Fire',
+    'Fusion Flare': 'Fire',
+    'Fusion Bolt': 'Electric'
+}
+
+ev_to_text = {
+    'ev_hp': 'HP',
+    'ev_attack': 'Atk',
+    'ev_defense': 'Def',
+    'ev_speed': 'Speed',
+    'ev_sp_attack': 'SpAtk',
+    'ev_sp_defense': 'SpDef'
+}
@@ -1,114 +1,183 @@
-import numpy as np
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import gifwriter
+import hashlib
+import json
+import logging
 import os
-import shutil
+import pipeline
+import profiling
+import sinks
+import sys
+import time
 import traceback
-from PIL import Image, ImageOps
+from concurrent import futures
+from io import BytesIO
+from bundle import SpriteBundle
+from lazy import lazy_import
 from resources.pokedex import name_to_dex, mirror_exclusions
 
-def create_front_sprite(directory: str, margin=True, alpha=0):
+np = lazy_import('numpy')
+Image = lazy_import('PIL.Image')
 
-    # Initialize arrays for our RGB tuples
-    normal_rgb = []
-    shiny_rgb = []
+# What was made is logged at INFO, the command line and GUI show it on stdout
+logger = logging.getLogger(__name__)
+
+# Converter resources like sparkles.png, next to this file
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources')
+
+def create_front_sprite(directory: str, margin=True, alpha=0, sink=None, bundle=None, variants=None):
+    timer = profiling.get_timer(directory, 'front')
+    bundle = bundle or SpriteBundle(directory)
 
     # Open front image
     try:
-        front_img = Image.open(f'sprites/{directory}/front.png')
+        front_img = bundle.image('front.png')
     except FileNotFoundError:
         return
 
-    # Get list of colors in front.png, includes black, white, transparent, and up to 2 more colors
-    color_list = front_img.getcolors()
-    for color in color_list:
-        normal_rgb.append(color[1])
+    # Non black, white, transparent colors of front.png sorted by brightness, and
+    # the shiny.pal colors they turn into
+    normal_rgb = bundle.normal_rgb('front.png')
+    shiny_rgb = bundle.shiny_rgb
+    timer.lap('decode')
 
-    # Get non black, white, transparent pixel colors
-    normal_rgb = [rgb for rgb in normal_rgb if (rgb != (255, 255, 255, 0) and rgb != (255, 255, 255, 255) and rgb != (0, 0, 0, 255))]
-    # then sort by 'brightness'
-    normal_rgb.sort(key = lambda x: x[0] *0.2126 + x[1] * 0.7152 + x[2] * 0.0722, reverse=True)
+    # Work on palette indices from here on. The shiny sprite is the same image
+    # with the normal colors swapped for the shiny ones in the palette.
+    front_pixels, palette = get_indexed_pixels(front_img)
+    background = get_palette_index(palette, (255,255,255,alpha))
+    shiny_palette = get_shiny_palette(palette, normal_rgb, shiny_rgb)
+    timer.lap('palette')
 
-    # Open shiny.pal, get the shiny rgb values, convert them from rgb555 to rgb888
-    with open(f'sprites/{directory}/shiny.pal', 'r') as f:
-        for line in f:
-            line = line.strip()
-            if 'RGB' in line:
-                r = int(line.split(' ')[1].strip(',')) * 255 // 31
-                g = int(line.split(' ')[2].strip(',')) * 255 // 31
-                b = int(line.split(' ')[3].strip(',')) * 255 // 31
-                shiny_rgb.append((r, g, b, 255))
-
-    # Swap normal palette with shiny palette.
-    pixel_data = np.array(front_img)
-    pixel_data[(pixel_data == normal_rgb[0]).all(axis = -1)] = shiny_rgb[0]
-    if len(normal_rgb) > 1:
-        pixel_data[(pixel_data == normal_rgb[1]).all(axis = -1)] = shiny_rgb[1]
-    front_img_shiny = Image.fromarray(pixel_data, mode='RGBA')
-
-    # Create animation and save.
-    img_frames, img_animation, img_frame_duration = get_animation(front_img, directory)
-    img_shiny_frames, img_shiny_animation, img_shiny_frame_duration = get_animation(front_img_shiny, directory)
+    # Create animation and save. frames is a (n, w, w) view of the sheet and the
+    # animation an array of indices into it.
+    frames, animation, frame_duration = get_animation(front_pixels, directory, bundle.root)
 
     # Margins are needed to align the sprites correctly in pokemmo
     if margin:
-        margin_image_animation = []
-        for frame in img_animation:
-            w, h = frame.size
-            center = (96 - w) // 2
-            new_img = Image.new(frame.mode, (96, 96), (255,255,255,alpha))
-            new_img.paste(frame, (center, 96-4-h)) 
-            margin_image_animation.append(new_img)
-        img_animation = margin_image_animation
-
-        margin_image_shiny_animation = []
-        for frame in img_shiny_animation:
-            w, h = frame.size
-            center = (96 - w) // 2
-            new_shiny_img = Image.new(frame.mode, (96, 96), (255,255,255,alpha))
-            new_shiny_img.paste(frame, (center, 96-4-h)) 
-            margin_image_shiny_animation.append(new_shiny_img)
-        img_shiny_animation = margin_image_shiny_animation
-
-    # Save result to output folder
-    img_animation[0].save(f'output/sprites/battlesprites/{name_to_dex[directory]}-front-n.gif', save_all=True, append_images=img_animation[1:], duration=img_frame_duration, disposal=2, loop=0)
-    img_shiny_animation[0].save(f'output/sprites/battlesprites/{name_to_dex[directory]}-front-s.gif', save_all=True, append_images=img_shiny_animation[1:], duration=img_shiny_frame_duration, disposal=2, loop=0)    
-    print(f'Created front battle sprites for {directory}')
-
-def get_animation(image: Image, directory: str):
-
-    # Initializing some stuff
-    w, h = image.size
+        frames = get_margin_frames(frames, background, 4)
+    timer.lap('composite')
+
+    # Save result to output folder. Every palette shares the same encoded frames.
+    sink = sink or sinks.DirectorySink()
+    palettes = get_variant_palettes(directory, variants, palette, shiny_palette, normal_rgb)
+    encoded_frames, frame_duration, rects, disposals = get_encoded_animation(frames, animation, frame_duration, gifwriter.get_transparency(palette))
+    size = (frames.shape[2], frames.shape[1])
+    gifs = { f'sprites/battlesprites/{name_to_dex[directory]}-front-{variant}.gif': gifwriter.write_gif(size, variant_palette, encoded_frames, frame_duration, disposal=disposals, loop=0, rects=rects) for variant, variant_palette in palettes.items() }
+    timer.lap('encode')
+
+    for path, gif in gifs.items():
+        sink.write(path, gif)
+    timer.lap('write')
+    logger.info(f'Created front battle sprites for {directory}')
+    return list(gifs)
+
+def get_animation(image, directory: str, root='.'):
+    # image is the sheet of frames stacked top to bottom, as an Image or array.
+    # Returns the frames as one (n, w, w, ...) array, a view of the sheet when it
+    # already is one, the frame indices anim.asm + anim_idle.asm play and their
+    # durations in ms.
+    pixels = np.asarray(image)
+    h, w = pixels.shape[:2]
     frame_num = h//w
-    frames = []
-    animation = []
-    frame_duration = []
+    frames = pixels[:frame_num * w].reshape((frame_num, w) + pixels.shape[1:])
+
+    frame_indices, frame_duration = get_animation_program(directory, root)
+    return frames, frame_indices, frame_duration.tolist()
+
+def get_margin_frames(frames: np.ndarray, background: int, bottom: int) -> np.ndarray:
+    # Every frame centered on a 96x96 canvas, bottom pixels above the lower edge.
+    # Done once per frame of the sheet, however often the animation shows it.
+    n, h, w = frames.shape[:3]
+    canvas = np.full((n, 96, 96) + frames.shape[3:], background, dtype=frames.dtype)
+    center = (96 - w) // 2
+    canvas[:, 96 - bottom - h:96 - bottom, center:center + w] = frames
+    return canvas
+
+def get_encoded_animation(frames: np.ndarray, animation, durations: list, transparency=None):
+    # GIF image data, durations, rectangles and disposal methods for a looping
+    # animation. Steps that repeat the same frame become one, every following
+    # frame only redraws the rectangle that changed. The LZW data only depends on
+    # palette indices, so it is the same for every palette.
+
+    # Sheet frames with the same pixels count as the same frame
+    first = {}
+    same = [ first.setdefault(frame.tobytes(), i) for i, frame in enumerate(frames) ]
+    steps, durations = gifwriter.merge_frames([ same[i] for i in animation.tolist() ], durations)
+    rects, disposals = gifwriter.get_frame_rects([ frames[i] for i in steps ], transparency, loop=True)
+
+    encoded = {}
+    data = []
+    for step, (x, y, w, h) in zip(steps, rects):
+        if (step, x, y, w, h) not in encoded:
+            encoded[(step, x, y, w, h)] = gifwriter.encode_frame(get_frame_image(frames[step, y:y + h, x:x + w]))
+        data.append(encoded[(step, x, y, w, h)])
+    return data, durations, rects, disposals
+
+def get_frame_image(frame: np.ndarray) -> Image:
+    # P mode image of an (h, w) array of palette indices
+    return Image.frombytes('P', (frame.shape[1], frame.shape[0]), frame.tobytes())
+
+animation_programs = {}
+
+def get_animation_program(directory: str, root='.'):
+    # Frame index and duration (ms) arrays for anim.asm followed by anim_idle.asm,
+    # ending on frame 0 for 800ms. Compiled once per directory and reused until
+    # either file changes.
+    paths = tuple(os.path.join(root, 'sprites', directory, name) for name in ('anim.asm', 'anim_idle.asm'))
+    stamps = tuple(os.stat(path).st_mtime_ns for path in paths)
+
+    cached = animation_programs.get(paths)
+    if cached and cached[0] == stamps:
+        return cached[2]
+
+    contents = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    digest = hashlib.sha1(b'\0'.join(contents)).hexdigest()
+
+    if cached and cached[1] == digest:
+        animation_programs[paths] = (stamps, digest, cached[2])
+        return cached[2]
+
+    steps = []
+    for content in contents:
+        steps += compile_asm(content.decode().splitlines(keepends=True))
+    steps.append((0, 800))
+
+    program = (np.array([ step[0] for step in steps ], dtype=np.intp), np.array([ step[1] for step in steps ], dtype=np.intp))
+    animation_programs[paths] = (stamps, digest, program)
+    return program
+
+def compile_asm(lines) -> list:
+    # Same rules as get_modified_asm, but straight to (frame index, duration) steps.
+    # Note that repeated frames are never cleared, a later dorepeat plays them again.
+    repeated = []
+    steps = []
+    repeat_amount = 0
 
-    # Separate frames
-    for i in range(0, frame_num):
-        frames.append(image.crop((0,w*i,w,w*(i+1))))
+    for line in lines:
+        if 'setrepeat' in line:
+            repeat_amount = int(line.strip().split(' ')[1])
 
-    # Get frame durations
-    for line in get_modified_asm(f'sprites/{directory}/anim.asm').splitlines():
-        line = line.strip()
-        if line == 'endanim':
-            break
+        if 'dorepeat' in line:
+            steps.extend(repeated * repeat_amount)
 
-        arr = line.split(' ')
-        animation.append(frames[int(arr[1].strip(','))])
-        frame_duration.append(int(arr[2]) * 16)
+        if 'frame' in line:
+            arr = line.strip().split(' ')
+            step = (int(arr[1].strip(',')), int(arr[2]) * 16)
+            if repeat_amount:
+                repeated.append(step)
+            else:
+                steps.append(step)
 
-    for line in get_modified_asm(f'sprites/{directory}/anim_idle.asm').splitlines():
-        line = line.strip()
-        if line == 'endanim':
+        if 'endanim' in line:
             break
 
-        arr = line.split(' ')
-        animation.append(frames[int(arr[1].strip(','))])
-        frame_duration.append(int(arr[2]) * 16)
-
-    animation.append(frames[0])
-    frame_duration.append(800)
-
-    return frames, animation, frame_duration
+    return steps
 
 def get_modified_asm(file_path: str) -> str:
     temp = ''
@@ -136,80 +205,108 @@ def get_modified_asm(file_path: str) -> str:
         
     return modified_asm
 
-def create_back_sprite(directory: str, margin=True, alpha=0):
-
-    # Initialize arrays for our RGB tuples
-    normal_rgb = []
-    shiny_rgb = []
+def create_back_sprite(directory: str, margin=True, alpha=0, sink=None, bundle=None, variants=None):
+    timer = profiling.get_timer(directory, 'back')
+    bundle = bundle or SpriteBundle(directory)
 
     # Open back image
     try:
-        back_img = Image.open(f'sprites/{directory}/back.png')
+        back_img = bundle.image('back.png')
     except FileNotFoundError:
         return
 
-    # Get list of colors in the sprite, should be 4, including black and white.
-    color_list = back_img.getcolors()
-    for color in color_list:
-        normal_rgb.append(color[1])
-
-    # Get non black, white, transparent pixel colors
-    normal_rgb = [rgb for rgb in normal_rgb if (rgb != (255, 255, 255, 0) and rgb != (255, 255, 255, 255) and rgb != (0, 0, 0, 255))]
-    
-    # Sometimes theres only one color in the back sprite. So we load the front sprite since shiny.pal has 2
-    # Honestly while going through this, I dont even know if this is needed
-    # ... I dont think its needed but im going to leave it here for now.
-    # 
-    # if len(normal_rgb) < 2:
-    #     normal_rgb = []
-    #     front_img = Image.open(f'sprites/{directory}/front.png')
-    #     color_list = front_img.getcolors()
-    #     for color in color_list:
-    #         normal_rgb.append(color[1])
-    #     normal_rgb = [rgb for rgb in normal_rgb if (rgb != (255, 255, 255, 0) and rgb != (255, 255, 255, 255) and rgb != (0, 0, 0, 255))]
-
-    # then sort by 'brightness'
-    normal_rgb.sort(key = lambda x: x[0] *0.2126 + x[1] * 0.7152 + x[2] * 0.0722, reverse=True)
-
-    # Open shiny.pal, get the shiny rgb values, convert them from rgb555 to rgb888
-    with open(f'sprites/{directory}/shiny.pal', 'r') as f:
-        for line in f:
-            line = line.strip()
-            if 'RGB' in line:
-                r = int(line.split(' ')[1].strip(',')) * 255 // 31
-                g = int(line.split(' ')[2].strip(',')) * 255 // 31
-                b = int(line.split(' ')[3].strip(',')) * 255 // 31
-                a = 255
-                shiny_rgb.append((r, g, b, a))
+    # Colors of the sprite, should be 4 including black and white, so 2 to swap.
+    # Sometimes theres only one color in the back sprite. The front sprite colors
+    # used to be loaded for that case, but shiny.pal pairs up fine with just one.
+    normal_rgb = bundle.normal_rgb('back.png')
+    shiny_rgb = bundle.shiny_rgb
+    timer.lap('decode')
 
     # Swap normal palette with shiny palette.
-    pixel_data = np.array(back_img)
-    pixel_data[(pixel_data == normal_rgb[0]).all(axis = -1)] = shiny_rgb[0]
-    if len(normal_rgb) > 1:
-        pixel_data[(pixel_data == normal_rgb[1]).all(axis = -1)] = shiny_rgb[1]
-    back_img_shiny = Image.fromarray(pixel_data, mode='RGBA')
-    
+    back_pixels, palette = get_indexed_pixels(back_img)
+    background = get_palette_index(palette, (255,255,255,alpha))
+    shiny_palette = get_shiny_palette(palette, normal_rgb, shiny_rgb)
+    timer.lap('palette')
+
     # Margins are needed to align the sprites correctly in pokemmo
+    frames = back_pixels[None]
     if margin:
-        w, h = back_img.size
-        center = (96 - w) // 2
-        temp_img = Image.new(back_img.mode, (96, 96), (255,255,255,alpha))
-        temp_img.paste(back_img, (center, 96 - 12 - h)) 
-        back_img = temp_img
-
-        w, h = back_img_shiny.size
-        center = (96 - w) // 2
-        temp_img = Image.new(back_img_shiny.mode, (96, 96), (255,255,255,alpha))
-        temp_img.paste(back_img_shiny, (center, 96 - 12 - h))
-        back_img_shiny = temp_img
-
-    # Save result to output folder
-    back_img.save(f'output/sprites/battlesprites/{name_to_dex[directory]}-back-n.gif')
-    back_img_shiny.save(f'output/sprites/battlesprites/{name_to_dex[directory]}-back-s.gif')
-    print(f'Created back battle sprites for {directory}')
-
-def create_overworld_sprite(directory: str, mirror=True):                                                                                                                                                                                                                                                                                                                                                                                                                       
-    files = [ f.name for f in os.scandir(f'./sprites/{directory}') if 'overworld' in f.name ]
+        frames = get_margin_frames(frames, background, 12)
+    timer.lap('composite')
+
+    # Save result to output folder. Every palette shares the same encoded image.
+    sink = sink or sinks.DirectorySink()
+    palettes = get_variant_palettes(directory, variants, palette, shiny_palette, normal_rgb)
+    encoded_frames = [ gifwriter.encode_frame(get_frame_image(frames[0])) ]
+    size = (frames.shape[2], frames.shape[1])
+    gifs = { f'sprites/battlesprites/{name_to_dex[directory]}-back-{variant}.gif': gifwriter.write_gif(size, variant_palette, encoded_frames) for variant, variant_palette in palettes.items() }
+    timer.lap('encode')
+
+    for path, gif in gifs.items():
+        sink.write(path, gif)
+    timer.lap('write')
+    logger.info(f'Created back battle sprites for {directory}')
+    return list(gifs)
+
+def get_indexed_pixels(image: Image):
+    # (h, w) array of palette indices for an RGBA sprite plus its palette as a list
+    # of RGBA tuples. Unlike convert('P') nothing is quantized, every color keeps
+    # its own entry, except that all fully transparent pixels share one.
+    pixels = np.array(image.convert('RGBA'))
+    pixels[pixels[..., 3] == 0] = (255, 255, 255, 0)
+    # One big endian integer per pixel sorts exactly like the (r, g, b, a) rows
+    # would, so the palette order stays the same as a row wise unique
+    colors, indices = np.unique(pixels.view('>u4')[..., 0], return_inverse=True)
+    if len(colors) > 256:
+        raise ValueError(f'{len(colors)} colors do not fit in a palette')
+
+    colors = colors.astype('>u4').view(np.uint8).reshape(-1, 4)
+    return indices.astype(np.uint8).reshape(pixels.shape[:2]), [ tuple(color) for color in colors.tolist() ]
+
+def get_palette_index(palette: list, color: tuple) -> int:
+    if color not in palette:
+        palette.append(color)
+    return palette.index(color)
+
+def get_shiny_palette(palette: list, normal_rgb: list, shiny_rgb: list) -> list:
+    # normal_rgb and shiny_rgb pair up by position, as many as shiny.pal lists
+    swap = dict(zip(normal_rgb, shiny_rgb))
+    return [ swap.get(color, color) for color in palette ]
+
+def get_variant_palettes(directory: str, variants: dict, palette: list, shiny_palette: list, normal_rgb: list) -> dict:
+    # { file suffix: palette } for the normal and shiny sprite plus every variant
+    # of a palette set that has colors for this folder, see load_palette_set
+    palettes = { 'n': palette, 's': shiny_palette }
+    for variant, species in (variants or {}).items():
+        variant_rgb = species.get(directory) or species.get(directory.split('_')[0]) or species.get('*')
+        if variant_rgb:
+            palettes[variant] = get_shiny_palette(palette, normal_rgb, variant_rgb)
+    return palettes
+
+def load_palette_set(file_path: str) -> dict:
+    # A palette set is a JSON file of extra color variants for the battle sprites:
+    #
+    #   { "e": { "*": [[31, 24, 0], [12, 8, 0]], "pikachu": [[31, 31, 0], [20, 6, 6]] } }
+    #
+    # Each variant maps sprite folders (or their species, or '*' for any other) to
+    # the rgb555 colors that replace the sprite's own, brightest first like in
+    # shiny.pal. The variant name becomes the file suffix, 1-front-e.gif.
+    with open(file_path, 'r') as f:
+        palette_set = json.load(f)
+
+    variants = {}
+    for variant, species in palette_set.items():
+        if variant in ('n', 's'):
+            raise ValueError(f'Palette variant {variant!r} is taken by the normal and shiny sprites')
+        variants[variant] = { name: [ tuple(value * 255 // 31 for value in color) + (255,) for color in colors ] for name, colors in species.items() }
+    return variants
+
+def create_overworld_sprite(directory: str, mirror=True, sink=None, bundle=None):
+    timer = profiling.get_timer(directory, 'overworld')
+    bundle = bundle or SpriteBundle(directory)
+    files = [ file for file in bundle.files if 'overworld' in file ]
+    sink = sink or sinks.DirectorySink()
+    outputs = []
 
     for file in files:
         if '-shiny' in file:
@@ -219,19 +316,24 @@ def create_overworld_sprite(directory: str, mirror=True):
 
         modifier += get_form(directory)
 
-        overword_img = Image.open(f'sprites/{directory}/{file}')
+        # Extra forms that share a folder, overworld-1.png, overworld-shiny-1.png, ...
+        form = file.removesuffix('.png').split('-')[-1]
+        if form.isdigit():
+            modifier += f'-{form}'
+
+        overword_img = bundle.image(file)
 
         w, h = overword_img.size
 
-        frame_num = w//h
-        frames = []
-        for i in range(0, frame_num):
-            frames.append(overword_img.crop((h*i, 0, h*(i+1), h)))
+        # Frames are views into the strip, mirrored ones too
+        strip = np.asarray(overword_img.convert('RGBA'))
+        frames = [ strip[:, h*i:h*(i+1)] for i in range(w//h) ]
+        timer.lap('decode')
 
         left1 = frames[0]
         left2 = frames[1]
-        right1 = ImageOps.mirror(frames[0])
-        right2 = ImageOps.mirror(frames[1])
+        right1 = frames[0][:, ::-1]
+        right2 = frames[1][:, ::-1]
         up1 = frames[2]
         up2 = frames[3]
         up3 = frames[2]
@@ -240,75 +342,16 @@ def create_overworld_sprite(directory: str, mirror=True):
         down3 = frames[4]
 
         if mirror:
-            up3 = ImageOps.mirror(up1)
-
-            up_bbox = up1.getbbox()
-            if (up_bbox[2] - up_bbox[0]) % 2 != 0:
-                up1_x = get_center_of_mass(up1)
-                up2_x = get_center_of_mass(up2)
-                up3_x = get_center_of_mass(up3)
-
-                if up3_x - up2_x > .5:
-                    up3 = Image.new("RGBA", (16,16))
-                    up3.paste(ImageOps.mirror(up1), (-1, 0))
-
-                if up3_x - up2_x < -.5:
-                    up3 = Image.new("RGBA", (16,16))
-                    up3.paste(ImageOps.mirror(up1), (1, 0))
-
-                if up1_x - up2_x > .5:
-                    up1 = Image.new("RGBA", (16,16))
-                    up1.paste(ImageOps.mirror(up3), (-1, 0))
-
-                if up1_x - up2_x < -.5:
-                    up1 = Image.new("RGBA", (16,16))
-                    up1.paste(ImageOps.mirror(up3), (1, 0))
-
-            down3 = ImageOps.mirror(down1)
-
-            down_bbox = down1.getbbox()
-            if (down_bbox[2] - down_bbox[0]) % 2 != 0:
-                down1_x = get_center_of_mass(down1)
-                down2_x = get_center_of_mass(down2)
-                down3_x = get_center_of_mass(down3)
-
-                if down3_x - down2_x > .5:
-                    down3 = Image.new("RGBA", (16,16))
-                    down3.paste(ImageOps.mirror(down1), (-1, 0))
-                
-                if down3_x - down2_x < -.5:
-                    down3 = Image.new("RGBA", (16,16))
-                    down3.paste(ImageOps.mirror(down1), (1, 0))
-
-                if down1_x - down2_x > .5:
-                    down1 = Image.new("RGBA", (16,16))
-                    down1.paste(ImageOps.mirror(down3), (-1, 0))
-
-                if down1_x - down2_x < -.5:
-                    down1 = Image.new("RGBA", (16,16))
-                    down1.paste(ImageOps.mirror(down3), (1, 0))
-
-        canvas = Image.new('RGBA', (128, 128), (255, 255, 255, 0))
-
-        canvas.paste( down1, ((32 - down1.size[0]) // 2  +0, 32 - 2 - down1.size[1]) )
-        canvas.paste( down2, ((32 - down2.size[0]) // 2 +32, 32 - 2 - down2.size[1]) )
-        canvas.paste( down3, ((32 - down3.size[0]) // 2 +64, 32 - 2 - down3.size[1]) )
-        canvas.paste( down2, ((32 - down2.size[0]) // 2 +96, 32 - 2 - down2.size[1]) )
-
-        canvas.paste( left1, ((32 - left1.size[0]) // 2  +0, 32 - 2 - left1.size[1] +32) )
-        canvas.paste( left2, ((32 - left2.size[0]) // 2 +32, 32 - 2 - left2.size[1] +32) )
-        canvas.paste( left1, ((32 - left1.size[0]) // 2 +64, 32 - 2 - left1.size[1] +32) )
-        canvas.paste( left2, ((32 - left2.size[0]) // 2 +96, 32 - 2 - left2.size[1] +32) )
-
-        canvas.paste( right1, ((32 - right1.size[0]) // 2  +0, 32 - 2 - right1.size[1] +64) )
-        canvas.paste( right2, ((32 - right2.size[0]) // 2 +32, 32 - 2 - right2.size[1] +64) )
-        canvas.paste( right1, ((32 - right1.size[0]) // 2 +64, 32 - 2 - right1.size[1] +64) )
-        canvas.paste( right2, ((32 - right2.size[0]) // 2 +96, 32 - 2 - right2.size[1] +64) )
+            up1, up3 = get_mirrored_steps(up1, up2)
+            down1, down3 = get_mirrored_steps(down1, down2)
 
-        canvas.paste( up1, ((32 - up1.size[0]) // 2  +0, 32 - 2 - up1.size[1] +96) )
-        canvas.paste( up2, ((32 - up2.size[0]) // 2 +32, 32 - 2 - up2.size[1] +96) )
-        canvas.paste( up3, ((32 - up3.size[0]) // 2 +64, 32 - 2 - up3.size[1] +96) )
-        canvas.paste( up2, ((32 - up2.size[0]) // 2 +96, 32 - 2 - up2.size[1] +96) )
+        # Rows of the sheet by their atlasdata.txt names, see get_follow_layout
+        canvas = get_follow_sheet({
+            'north': [ down1, down2, down3, down2 ],
+            'west': [ left1, left2, left1, left2 ],
+            'east': [ right1, right2, right1, right2 ],
+            'south': [ up1, up2, up3, up2 ],
+        })
 
         if '-b-s' in modifier:
             canvas = add_sparkles(canvas)
@@ -317,9 +360,108 @@ def create_overworld_sprite(directory: str, mirror=True):
         if dex >= 649:
             dex = name_to_dex[directory.split('_')[0]]
 
-        canvas.save(f'output/sprites/followsprites/{dex}{modifier}.png')
+        timer.lap('composite')
+
+        png = get_png(canvas)
+        timer.lap('encode')
+
+        sink.write(f'sprites/followsprites/{dex}{modifier}.png', png)
+        outputs.append(f'sprites/followsprites/{dex}{modifier}.png')
+        timer.lap('write')
     
-    print(f'Created overworld sprites for {directory}')
+    logger.info(f'Created overworld sprites for {directory}')
+    return outputs
+
+# Pixels per frame slot of a follow sprite sheet unless atlasdata.txt sets
+# slot=, a frame sits centered and 2px above the bottom of its slot
+FOLLOW_SLOT = 32
+
+follow_layout = None
+
+def get_follow_layout() -> dict:
+    # The grid of resources/atlasdata.txt, read on first use and kept:
+    #
+    #   { 'rows': 4, 'columns': 4, 'slot': 32,
+    #     'offsets': { 'north': [(0, 0), (32, 0), (64, 0), (96, 0)], ... },
+    #     'background': ... }
+    #
+    # offsets are the top left corners of each direction's slots in animation
+    # order, background an empty sheet to copy. The rows it calls north, west,
+    # east and south are where the sheet has always had the down, left, right
+    # and up frames.
+    global follow_layout
+    if follow_layout is None:
+        settings = {}
+        with open(os.path.join(RESOURCES, 'atlasdata.txt'), 'r') as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if sep:
+                    settings[key] = value
+
+        columns = int(settings.pop('columns'))
+        rows = int(settings.pop('rows'))
+        size = int(settings.pop('slot', FOLLOW_SLOT))
+        offsets = {}
+        for direction, slots in settings.items():
+            offsets[direction] = [ (int(slot) % columns * size, int(slot) // columns * size) for slot in slots.split(',') ]
+        background = np.empty((rows * size, columns * size, 4), dtype=np.uint8)
+        background[:] = (255, 255, 255, 0)
+        follow_layout = { 'rows': rows, 'columns': columns, 'slot': size, 'offsets': offsets, 'background': background }
+    return follow_layout
+
+def get_follow_sheet(cycles: dict) -> Image:
+    # cycles is { direction: RGBA frame arrays in animation order }, all the same
+    # size. Every frame is copied into its slot of one preallocated canvas.
+    layout = get_follow_layout()
+    canvas = layout['background'].copy()
+
+    h, w = next(iter(cycles.values()))[0].shape[:2]
+    x, y = (layout['slot'] - w) // 2, layout['slot'] - 2 - h
+    if x < 0 or y < 0:
+        raise ValueError(f'{w}x{h} frames do not fit in {layout["slot"]}px slots')
+
+    for direction, frames in cycles.items():
+        slots = layout['offsets'][direction]
+        if len(slots) != len(frames):
+            raise ValueError(f'atlasdata.txt has {len(slots)} slots for {direction}, the sprite has {len(frames)} frames')
+        for (slot_x, slot_y), frame in zip(slots, frames):
+            canvas[slot_y + y:slot_y + y + h, slot_x + x:slot_x + x + w] = frame
+
+    return Image.fromarray(canvas, 'RGBA')
+
+def get_mirrored_steps(first: np.ndarray, middle: np.ndarray):
+    # A walk cycle's third frame is its first one mirrored. A sprite of odd width
+    # can't be mirrored in place, so when that moves it more than half a pixel
+    # away from the middle frame the third and then the first frame are shifted
+    # back by one.
+    third = first[:, ::-1]
+
+    columns = np.flatnonzero(first[..., 3].any(axis=0))
+    if len(columns) and (columns[-1] + 1 - columns[0]) % 2 != 0:
+        first_x, middle_x, third_x = get_centers_of_mass([ Image.fromarray(frame) for frame in (first, middle, third) ])
+
+        if third_x - middle_x > .5:
+            third = shift_pixels(first[:, ::-1], -1)
+
+        if third_x - middle_x < -.5:
+            third = shift_pixels(first[:, ::-1], 1)
+
+        if first_x - middle_x > .5:
+            first = shift_pixels(third[:, ::-1], -1)
+
+        if first_x - middle_x < -.5:
+            first = shift_pixels(third[:, ::-1], 1)
+
+    return first, third
+
+def shift_pixels(pixels: np.ndarray, dx: int) -> np.ndarray:
+    # Moved dx pixels to the right on a transparent background, what falls off is cut
+    shifted = np.zeros_like(pixels)
+    if dx >= 0:
+        shifted[:, dx:] = pixels[:, :pixels.shape[1] - dx]
+    else:
+        shifted[:, :dx] = pixels[:, -dx:]
+    return shifted
 
 def get_form(directory: str) -> str:
 
@@ -346,7 +488,7 @@ def get_form(directory: str) -> str:
             return '-3'
         case 'burmy_sandy':
             return '-1'
-        case 'burmy_sandy':
+        case 'burmy_trash':
             return '-2'
         case 'wormadam_sandy':
             return '-1'
@@ -401,45 +543,57 @@ def get_form(directory: str) -> str:
         case _:
             return ''
 
+sparkles = None
+
 def add_sparkles(image: Image):
-    sparkle = Image.open('resources/sparkles.png')
-    image.paste(sparkle, (0,0), sparkle)
+    # Loaded on first use and kept, it is the same for every shiny sprite
+    global sparkles
+    if sparkles is None:
+        sparkles = Image.open(os.path.join(RESOURCES, 'sparkles.png'))
+        sparkles.load()
+    image.paste(sparkles, (0,0), sparkles)
     return image
 
-def get_center_of_mass(image: Image):
-    data = image.getcolors()
-    color_list = []
-    for color in data:
-        color_list.append(color)
-
-    colors = [rgb for rgb in color_list if (rgb[1] != (255, 255, 255, 0) and rgb[1] != (255, 255, 255, 255) and rgb[1] != (0, 0, 0, 255) and rgb[1] != (0, 0, 0, 0))]
+def get_most_color(image: Image):
+    # Only the first two colors getcolors() reports are compared, so the pick
+    # depends on Pillow's ordering and has to stay on getcolors().
+    colors = [rgb for rgb in image.getcolors() if (rgb[1] != (255, 255, 255, 0) and rgb[1] != (255, 255, 255, 255) and rgb[1] != (0, 0, 0, 255) and rgb[1] != (0, 0, 0, 0))]
     
     if len(colors) > 1:
         if colors[0][0] > colors[1][0]:
-            most_color = colors[0][1]
+            return colors[0][1]
         else:
-            most_color = colors[1][1]
+            return colors[1][1]
     else:
-        most_color = colors[0][1]
+        return colors[0][1]
 
-    immat = image.load()
-    (x, y) = image.size
-    m = np.zeros((x, y))
+def get_center_of_mass(image: Image):
+    return get_centers_of_mass([image])[0]
 
-    for i in range(x):
-        for j in range(y):
-            m[i, j] = (immat[i, j] == most_color)
-    
-    m = m / np.sum(np.sum(m))
+def get_centers_of_mass(images: list):
+    # Column centroid of each frame's most used color. Frames must share a size
+    # and mode, any mode works.
+    most_colors = np.array([ get_most_color(image) for image in images ], dtype=np.uint8)
+    pixels = np.stack([ np.asarray(image) for image in images ])
 
-    dx = np.sum(m, 1)
-    return np.sum(dx * np.arange(x))
+    # Single band images (P, L) get a band axis of one, so they compare like RGBA
+    most_colors = most_colors.reshape(len(images), -1)
+    pixels = pixels.reshape(pixels.shape[:3] + (-1,))
 
-def create_monster_icon(directory: str, shiny=False, size=1):
+    # (frame, x, y) like the old per pixel matrix, so the float sums come out the same
+    m = (pixels == most_colors[:, None, None, :]).all(axis=-1).transpose(0, 2, 1).astype(np.float64, order='C')
+    m = m / m.sum(axis=(1, 2))[:, None, None]
+
+    dx = np.sum(m, 2)
+    return np.sum(dx * np.arange(m.shape[1]), 1)
+
+def create_monster_icon(directory: str, shiny=False, size=1, sink=None, bundle=None):
     # Size: 0 = 16x16 (Small) | 1 = 26x26 (Medium + Blurry) | 2 = 32x32 (Large)
+    timer = profiling.get_timer(directory, 'icon')
+    bundle = bundle or SpriteBundle(directory)
 
     # include 'icon' in files. should only be in egg
-    icon_files = [ f.name for f in os.scandir(f'./sprites/{directory}') if 'overworld' in f.name or 'icon' in f.name ]
+    icon_files = [ file for file in bundle.files if 'overworld' in file or 'icon' in file ]
     file = ''
     if 'icon.png' in icon_files:
         file = 'icon.png'
@@ -450,7 +604,7 @@ def create_monster_icon(directory: str, shiny=False, size=1):
     else:
         return    
 
-    monster_img = Image.open(f'sprites/{directory}/{file}')
+    monster_img = bundle.image(file)
 
     w, h = monster_img.size
 
@@ -458,6 +612,7 @@ def create_monster_icon(directory: str, shiny=False, size=1):
     frames = []
     for i in range(0, frame_num):
         frames.append(monster_img.crop((h * i, 0, h * (i + 1), h)))
+    timer.lap('decode')
 
     one_frame_exceptions = ['egg', 'egg_manaphy', 'krabby', 'kingler']
 
@@ -477,34 +632,581 @@ def create_monster_icon(directory: str, shiny=False, size=1):
     canvas = Image.new('RGBA', (36, 36), (255, 255, 255, 0))
     # -1 in the height calculation to make room for the alpha red outline.
     canvas.paste( icon_img, ((36 - w) // 2 , 36 - 1 - h) )
+    timer.lap('composite')
 
-    canvas.save(f'output/sprites/monstericons/{name_to_dex[directory]}-0.png')
-    print(f'Created monster icon for {directory}')
+    png = get_png(canvas)
+    timer.lap('encode')
 
-if __name__ == '__main__':
-    if not os.path.exists('output/sprites/battlesprites'):
-        os.makedirs('output/sprites/battlesprites')
-    if not os.path.exists('output/sprites/followsprites'):
-        os.makedirs('output/sprites/followsprites')
-    if not os.path.exists('output/sprites/monstericons'):
-        os.makedirs('output/sprites/monstericons')
+    sink = sink or sinks.DirectorySink()
+    sink.write(f'sprites/monstericons/{name_to_dex[directory]}-0.png', png)
+    timer.lap('write')
+    logger.info(f'Created monster icon for {directory}')
+    return [f'sprites/monstericons/{name_to_dex[directory]}-0.png']
+
+def get_png(image: Image) -> bytes:
+    f = BytesIO()
+    image.save(f, 'PNG')
+    return f.getvalue()
+
+MANIFEST_FILE = 'output/manifest.json'
 
-    dirs = [ f.name for f in os.scandir('./sprites') if f.is_dir() ]
+# The modules that decide what ends up in an output
+CONVERTER_MODULES = [ 'script.py', 'gifwriter.py', 'bundle.py', 'pngopt.py' ]
 
-    for dir in dirs:
+def get_converter_digest() -> str:
+    # Any change to the converter itself invalidates everything it built
+    digest = hashlib.sha1()
+    for module in CONVERTER_MODULES:
+        digest.update(module.encode())
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+SCRIPT_DIGEST = get_converter_digest()
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(manifest: dict):
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+INDEX_FILE = 'output/index.json'
+
+def load_index(root='.', file_path=INDEX_FILE) -> dict:
+    # What is in sprites/, per folder:
+    #
+    #   { 'mtime': ..., 'dex': 1, 'base_dex': 1, 'form': '', 'mirror': True,
+    #     'files': { 'front.png': { 'mtime': ..., 'size': [56, 560], 'frames': 10 }, 'shiny.pal': { 'mtime': ... }, ... } }
+    #
+    # Kept in file_path between runs, None builds it from scratch. A folder is only
+    # listed again when its own mtime changed and an image header only read again
+    # when the file's did.
+    cached = {}
+    if file_path is not None:
         try:
-            create_front_sprite(dir)
-            create_back_sprite(dir)
+            with open(file_path, 'r') as f:
+                cached = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    return refresh_index(cached, root)
+
+def refresh_index(cached: dict, root='.') -> dict:
+    # The index of what is in sprites/ now, reusing whatever in cached is still current
+    return { f.name: get_index_entry(f.name, cached.get(f.name), root) for f in os.scandir(os.path.join(root, 'sprites')) if f.is_dir() }
+
+def save_index(index: dict):
+    os.makedirs(os.path.dirname(INDEX_FILE), exist_ok=True)
+    with open(INDEX_FILE, 'w') as f:
+        json.dump(index, f, indent=1)
+
+def get_index_entry(directory: str, cached=None, root='.') -> dict:
+    path = os.path.join(root, 'sprites', directory)
+    mtime = os.stat(path).st_mtime_ns
+    cached_files = cached['files'] if cached else {}
+    if cached and cached['mtime'] == mtime:
+        names = list(cached_files)
+    else:
+        names = [ f.name for f in os.scandir(path) if f.is_file() ]
 
-            if dir in mirror_exclusions:
-                create_overworld_sprite(dir, False)
+    files = {}
+    for name in names:
+        file_mtime = os.stat(os.path.join(path, name)).st_mtime_ns
+        if name in cached_files and cached_files[name]['mtime'] == file_mtime:
+            files[name] = cached_files[name]
+        else:
+            files[name] = get_file_info(os.path.join(path, name), file_mtime)
+
+    # Cheap to look up, but a pokedex edit must show up without touching sprites/
+    return {
+        'mtime': mtime,
+        'dex': name_to_dex.get(directory),
+        'base_dex': name_to_dex.get(directory.split('_')[0]),
+        'form': get_form(directory),
+        'mirror': directory not in mirror_exclusions,
+        'files': files,
+    }
+
+def get_file_info(file_path: str, mtime: int) -> dict:
+    info = { 'mtime': mtime }
+    if file_path.endswith('.png'):
+        # Only the header is read, nothing gets decoded
+        try:
+            with Image.open(file_path) as image:
+                w, h = image.size
+        except (OSError, SyntaxError):
+            # Broken or half saved, listed without a size so the stage that
+            # decodes it fails for this folder alone and the index sees it again
+            # once its mtime changes
+            return info
+        info['size'] = [w, h]
+        # Front sprites stack their frames vertically, overworld sheets side by side
+        if os.path.basename(file_path) == 'front.png':
+            info['frames'] = h // w
+        else:
+            info['frames'] = max(w // h, 1)
+    return info
+
+def has_inputs(files, stage: str) -> bool:
+    # Whether a sprite folder has what the stage needs to make anything at all
+    match stage:
+        case 'front':
+            return 'front.png' in files
+        case 'back':
+            return 'back.png' in files
+        case 'overworld':
+            return any('overworld' in file for file in files)
+        case 'icon':
+            return 'icon.png' in files or 'overworld.png' in files or 'overworld-shiny.png' in files
+    return False
+
+def get_stage_inputs(bundle: SpriteBundle, stage: str) -> list:
+    # Names of the files in the sprite folder the stage reads
+    files = bundle.files
+
+    match stage:
+        case 'front':
+            names = ['front.png', 'shiny.pal', 'anim.asm', 'anim_idle.asm']
+        case 'back':
+            names = ['back.png', 'shiny.pal']
+        case 'overworld':
+            names = sorted(file for file in files if 'overworld' in file)
+        case 'icon':
+            names = sorted(file for file in files if 'overworld' in file or 'icon' in file)
+
+    return names
+
+def get_stage_digest(bundle: SpriteBundle, stage: str, options: tuple) -> str:
+    directory = bundle.directory
+    digest = hashlib.sha1()
+    # Everything besides file contents that ends up in the output: converter code,
+    # stage options and the pokedex entries used to name the files.
+    digest.update(repr((SCRIPT_DIGEST, stage, options, name_to_dex.get(directory), name_to_dex.get(directory.split('_')[0]))).encode())
+
+    # The bundle keeps what is read here, so hashing costs no extra file reads
+    for name in get_stage_inputs(bundle, stage):
+        digest.update(f'sprites/{directory}/{name}'.encode())
+        try:
+            digest.update(hashlib.sha1(bundle.read(name)).digest())
+        except FileNotFoundError:
+            digest.update(b'missing')
+
+    if stage == 'overworld':
+        # The sheet layout and the sparkles of the shiny ones
+        for name in ('atlasdata.txt', 'sparkles.png'):
+            digest.update(f'resources/{name}'.encode())
+            with open(os.path.join(RESOURCES, name), 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+
+    return digest.hexdigest()
+
+def build_stage(entries: dict, directory: str, stage: str, *args, sink=None, bundle=None, **kwargs) -> bool:
+    # entries is the manifest of one directory, { stage: {digest, outputs} }.
+    # Returns False when the recorded outputs are still current and nothing ran.
+    sink = sink or sinks.DirectorySink()
+    bundle = bundle or SpriteBundle(directory)
+    if not has_inputs(bundle.files, stage):
+        # Nothing to build, whatever it made before is stale
+        entries.pop(stage, None)
+        return False
+
+    digest = get_stage_digest(bundle, stage, (args, sorted(kwargs.items())))
+    entry = entries.get(stage)
+    if entry and entry['digest'] == digest and all(sink.exists(name) for name in entry['outputs']):
+        return False
+
+    entries.pop(stage, None)
+    outputs = STAGES[stage](directory, *args, sink=sink, bundle=bundle, **kwargs) or []
+    entries[stage] = { 'digest': digest, 'outputs': outputs }
+    return True
+
+def get_outputs(entries: dict) -> set:
+    return { name for entry in (entries or {}).values() for name in entry['outputs'] }
+
+def remove_outputs(entries: dict, stages=None, sink=None):
+    sink = sink or sinks.DirectorySink()
+    for stage in list(entries):
+        if stages is None or stage in stages:
+            for name in entries.pop(stage)['outputs']:
+                sink.remove(name)
+
+STAGES = {
+    'front': create_front_sprite,
+    'back': create_back_sprite,
+    'overworld': create_overworld_sprite,
+    'icon': create_monster_icon,
+}
+
+def create_sprites(directory: str, entries=None, force=False, sink=None, variants=None, info=None, bundle=None, stages=None, shiny_icons=False):
+    # Builds every out of date asset for one directory and returns its updated
+    # manifest entries. Errors are printed and swallowed so one broken sprite
+    # folder never stops the rest of the run (or a worker). info is the folder's
+    # sprite index entry, without one the folder is listed here. stages limits
+    # the build to some of STAGES, the others keep their entries as they are.
+    stages = stages or STAGES
+    entries = {} if entries is None else entries
+    if force:
+        for stage in stages:
+            entries.pop(stage, None)
+    # One bundle for all stages, every input is read and decoded once
+    bundle = bundle or SpriteBundle(directory, info['files'] if info else None)
+    try:
+        if 'front' in stages:
+            build_stage(entries, directory, 'front', sink=sink, bundle=bundle, variants=variants)
+        if 'back' in stages:
+            build_stage(entries, directory, 'back', sink=sink, bundle=bundle, variants=variants)
+
+        if 'overworld' in stages:
+            if not (info['mirror'] if info else directory not in mirror_exclusions):
+                build_stage(entries, directory, 'overworld', False, sink=sink, bundle=bundle)
             else:
-                create_overworld_sprite(dir)
-            
-            create_monster_icon(dir)
+                build_stage(entries, directory, 'overworld', sink=sink, bundle=bundle)
+
+        if 'icon' in stages:
+            build_stage(entries, directory, 'icon', sink=sink, bundle=bundle, shiny=shiny_icons)
+
+    except Exception:
+        traceback.print_exc()
+
+    return entries
+
+def create_sprites_worker(directory: str, entries: dict, force: bool, sink, variants: dict, info: dict, stages: list, shiny_icons: bool):
+    # Process pool entry point, sink is a MemorySink whose files go back to the parent
+    entries = create_sprites(directory, entries, force, sink, variants, info, stages=stages, shiny_icons=shiny_icons)
+    return entries, sink.files, profiling.pop_timings(directory)
+
+def prefetch_bundle(directory: str, info=None, stages=None) -> SpriteBundle:
+    # A bundle with every input of the folder (for stages) already read and its images decoded
+    bundle = SpriteBundle(directory, info['files'] if info else None)
+    for stage in stages or STAGES:
+        if has_inputs(bundle.files, stage):
+            for name in get_stage_inputs(bundle, stage):
+                if name in bundle.files:
+                    if name.endswith('.png'):
+                        bundle.image(name)
+                    else:
+                        bundle.read(name)
+    return bundle
+
+def build_sprites_pipelined(dirs: list, entries: list, force: bool, sink, variants=None, infos=None, depth=8, stages=None, shiny_icons=False) -> list:
+    # Serial build with the next folders read ahead on one thread and the finished
+    # files written behind on another, see pipeline.run
+    def read(i):
+        return prefetch_bundle(dirs[i], infos[i], stages)
+
+    def compute(i, bundle):
+        folder_sink = sinks.MemorySink(sink)
+        result = create_sprites(dirs[i], entries[i], force, folder_sink, variants, infos[i], bundle, stages, shiny_icons)
+        return result, folder_sink.files
+
+    def write(files):
+        for name, data in files:
+            sink.write(name, data)
+
+    return pipeline.run(list(range(len(dirs))), read, compute, write, depth)
+
+def init_worker(profile: bool, level: int):
+    # Spawned workers start without the parent's logging setup and profiler
+    logging.basicConfig(stream=sys.stdout, level=level, format='%(message)s')
+    if profile:
+        profiling.enable()
+
+def build_sprites(dirs: list, entries: list, force: bool, sink, jobs=1, variants=None, infos=None, pipelined=0, stages=None, shiny_icons=False) -> list:
+    # Runs create_sprites for every directory, returns their manifest entries.
+    # infos are the sprite index entries of dirs, if there is an index.
+    # pipelined is the queue depth of a pipelined serial build, 0 for none.
+    infos = infos or [ None ] * len(dirs)
+    if jobs <= 1 and pipelined:
+        return build_sprites_pipelined(dirs, entries, force, sink, variants, infos, pipelined, stages, shiny_icons)
+    if jobs <= 1:
+        return [ create_sprites(dir, entry, force, sink, variants, info, stages=stages, shiny_icons=shiny_icons) for dir, entry, info in zip(dirs, entries, infos) ]
+
+    # Results come back in directory order, so the result is the same as a
+    # serial run no matter which worker finishes first.
+    worker_sinks = [ sink.worker_sink() for dir in dirs ]
+    results = []
+    with futures.ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(profiling.timings is not None, logging.getLogger().getEffectiveLevel())) as executor:
+        for dir, (result, files, timings) in zip(dirs, executor.map(create_sprites_worker, dirs, entries, [ force ] * len(dirs), worker_sinks, [ variants ] * len(dirs), infos, [ stages ] * len(dirs), [ shiny_icons ] * len(dirs), chunksize=8)):
+            profiling.merge_timings(dir, timings)
+            timer = profiling.get_timer(dir, 'parent')
+            for name, data in files:
+                sink.write(name, data)
+            timer.lap('write')
+            results.append(result)
+    return results
+
+def get_dex_ranges(text: str) -> list:
+    # '1-151,201' -> [(1, 151), (201, 201)], the type of --dex
+    ranges = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        try:
+            ranges.append((int(first), int(last or first)))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'{part!r} is not a dex number or a range like 252-386')
+    return ranges
 
+STAGE_NAMES = { 'front': 'front', 'back': 'back', 'overworld': 'overworld', 'icons': 'icon', 'icon': 'icon' }
+
+def get_stage_names(text: str) -> list:
+    # 'front,icons' -> ['front', 'icon'], the type of --only
+    try:
+        return [ STAGE_NAMES[name.strip()] for name in text.split(',') ]
+    except KeyError as e:
+        raise argparse.ArgumentTypeError(f'{e.args[0]!r} is not one of front, back, overworld, icons')
+
+def get_national_dex(info: dict):
+    # Forms have numbers of their own in name_to_dex, they count as their species
+    return info['base_dex'] if info['form'] else info['dex']
+
+def select_dirs(index: dict, dex_ranges=None, patterns=None) -> list:
+    # The folders of the sprite index whose species is in one of dex_ranges and
+    # whose name matches one of the fnmatch patterns, None selects everything
+    dirs = []
+    for dir, info in index.items():
+        dex = get_national_dex(info)
+        if dex_ranges and not (dex and any(first <= dex <= last for first, last in dex_ranges)):
+            continue
+        if patterns and not any(fnmatch.fnmatchcase(dir, pattern) for pattern in patterns):
+            continue
+        dirs.append(dir)
+    return dirs
+
+def remove_stale_outputs(previous_outputs: list, results: list, sink):
+    # Rebuilt stages can produce fewer files than before, a palette variant that was dropped
+    for outputs, result in zip(previous_outputs, results):
+        for name in outputs - get_outputs(result):
+            sink.remove(name)
+
+def write_mod_zip(zip_path: str, root='output'):
+    # Brings a mod zip up to date with root/sprites and the mod's icon.png and
+    # info.xml, only the entries that changed are written
+    sink = sinks.ZipSink(zip_path)
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root, 'sprites')):
+        dirnames.sort()
+        for name in sorted(filenames):
+            file_path = os.path.join(dirpath, name)
+            sinks.write_file(sink, os.path.relpath(file_path, root).replace(os.sep, '/'), file_path)
+    sinks.write_file(sink, 'icon.png', os.path.join(RESOURCES, 'icon.png'))
+    sinks.write_file(sink, 'info.xml', os.path.join(RESOURCES, 'info.xml'))
+    sink.close()
+
+def get_changed(old: dict, new: dict) -> set:
+    return { key for key in old.keys() | new.keys() if old.get(key) != new.get(key) }
+
+def get_resource_mtimes() -> dict:
+    return { f.name: f.stat().st_mtime_ns for f in os.scandir(RESOURCES) if f.is_file() }
+
+def watch_sprites(index: dict, manifest: dict, sink, variants=None, zip_path=None, interval=0.25, dex_ranges=None, patterns=None, stages=None, shiny_icons=False):
+    # Polls sprites/ and resources/ every interval seconds until interrupted and
+    # rebuilds the folders whose files changed. Saves usually come in bursts, so
+    # a change is only built once nothing moved for another interval. The sprite
+    # index makes a poll a stat per file, and the manifest skips the stages of a
+    # changed folder whose inputs are the same. Only the folders and stages a
+    # selective build would make are rebuilt, see select_dirs.
+    global sparkles, follow_layout
+    resources = get_resource_mtimes()
+    print('Watching sprites/ and resources/ for changes, Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                latest, latest_resources = refresh_index(index), get_resource_mtimes()
+                if latest == index and latest_resources == resources:
+                    continue
+
+                changed = get_changed(index, latest)
+                while True:
+                    time.sleep(interval)
+                    settled, settled_resources = refresh_index(latest), get_resource_mtimes()
+                    if settled == latest and settled_resources == latest_resources:
+                        break
+                    changed |= get_changed(latest, settled)
+                    latest, latest_resources = settled, settled_resources
+
+                start = time.perf_counter()
+                changed_resources = get_changed(resources, latest_resources)
+                if 'pokedex.py' in changed_resources:
+                    print('resources/pokedex.py changed, restart to use it')
+                if 'sparkles.png' in changed_resources or 'atlasdata.txt' in changed_resources:
+                    # Part of every overworld digest, the manifest finds the stages they affect
+                    sparkles = None
+                    follow_layout = None
+                    changed = set(index) | set(latest)
+                if 'atlasdata.txt' in changed_resources:
+                    sinks.write_file(sink, 'sprites/followsprites/atlasdata.txt', os.path.join(RESOURCES, 'atlasdata.txt'))
+
+                for dir in changed - set(latest):
+                    remove_outputs(manifest.pop(dir, {}), sink=sink)
+
+                dirs = [ dir for dir in select_dirs(latest, dex_ranges, patterns) if dir in changed ]
+                entries = [ manifest.get(dir) for dir in dirs ]
+                previous_outputs = [ get_outputs(entry) for entry in entries ]
+                results = build_sprites(dirs, entries, False, sink, 1, variants, [ latest[dir] for dir in dirs ], stages=stages, shiny_icons=shiny_icons)
+                remove_stale_outputs(previous_outputs, results, sink)
+                manifest.update(zip(dirs, results))
+                save_manifest(manifest)
+                save_index(latest)
+
+                if zip_path:
+                    write_mod_zip(zip_path)
+                index, resources = latest, latest_resources
+                print(f'Updated {len(changed)} sprite folders in {time.perf_counter() - start:.2f}s')
+            except Exception:
+                # A file caught mid save and the like, nothing was marked as
+                # done so the next poll finds the same changes and tries again
+                logger.exception('Update failed, retrying on the next poll')
+    except KeyboardInterrupt:
+        pass
+
+def build(root='.', dirs=None, front=True, back=True, overworld=True, icons=True, margin=True, alpha=0, mirror=True, shiny_icons=False, variants=None, mod_files=False):
+    # Converts the sprite folders in root/sprites (all of them, or dirs) and yields
+    # (archive path, data) for every file as soon as its folder is done. Nothing
+    # is written to disk or printed, what was made is logged. The options are the
+    # ones of the create_* functions, mod_files adds the icon.png and info.xml a
+    # PokeMMO mod needs:
+    #
+    #   for name, data in script.build('path/to/crystal2gif'):
+    #       cache[name] = data
+    index = load_index(root, None)
+    for directory in dirs or index:
+        info = index[directory]
+        bundle = SpriteBundle(directory, info['files'], root)
+        sink = sinks.MemorySink()
+        try:
+            if front and has_inputs(bundle.files, 'front'):
+                create_front_sprite(directory, margin, alpha, sink=sink, bundle=bundle, variants=variants)
+            if back and has_inputs(bundle.files, 'back'):
+                create_back_sprite(directory, margin, alpha, sink=sink, bundle=bundle, variants=variants)
+            if overworld and has_inputs(bundle.files, 'overworld'):
+                create_overworld_sprite(directory, mirror and info['mirror'], sink=sink, bundle=bundle)
+            if icons and has_inputs(bundle.files, 'icon'):
+                create_monster_icon(directory, shiny=shiny_icons, sink=sink, bundle=bundle)
         except Exception:
-            traceback.print_exc()
+            # Like create_sprites, one broken folder doesn't end the build
+            logger.exception(f'Failed to convert {directory}')
+        yield from sink.files
+
+    extras = []
+    if overworld:
+        extras.append(('sprites/followsprites/atlasdata.txt', 'atlasdata.txt'))
+    if mod_files:
+        extras += [ ('icon.png', 'icon.png'), ('info.xml', 'info.xml') ]
+    for name, resource in extras:
+        with open(os.path.join(RESOURCES, resource), 'rb') as f:
+            yield name, f.read()
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description='Convert Crystal style sprites into PokeMMO assets.')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of worker processes, 0 = one per cpu (default: 1)')
+    parser.add_argument('-f', '--force', action='store_true', help='rebuild everything, even outputs that are up to date')
+    parser.add_argument('-z', '--zip', metavar='PATH', help='write everything straight into a mod zip at PATH instead of output/')
+    parser.add_argument('--atlas', nargs='?', type=int, const=2048, metavar='SIZE', help='pack the follow sprites into SIZE x SIZE textures with an index instead of a png each (default: 2048)')
+    parser.add_argument('--pipeline', nargs='?', type=int, const=8, default=0, metavar='DEPTH', help='with -j 1, read ahead and write behind on their own threads, up to DEPTH folders queued (default: 8)')
+    parser.add_argument('-O', '--optimize-png', action='store_true', help='losslessly shrink the follow sprite and monster icon pngs, slow but smaller')
+    parser.add_argument('--dex', type=get_dex_ranges, metavar='RANGES', help='only the species with these national dex numbers, like 252-386 or 1-151,201')
+    parser.add_argument('--species', action='append', metavar='PATTERN', help="only the sprite folders matching PATTERN, like 'unown_*', can be repeated")
+    parser.add_argument('--only', type=get_stage_names, metavar='KINDS', help='only make these kinds of assets, out of front, back, overworld, icons (default: all)')
+    parser.add_argument('--shiny-icons', action='store_true', help='make the monster icons from the shiny overworld sprites')
+    parser.add_argument('-p', '--palettes', metavar='FILE', help='also render every variant of a palette set file for the battle sprites, see load_palette_set')
+    parser.add_argument('-w', '--watch', nargs='?', type=float, const=0.25, metavar='SECONDS', help='keep running and rebuild what changes in sprites/ and resources/, checking every SECONDS (default: 0.25)')
+    parser.add_argument('--profile', nargs='?', const='profile.json', metavar='REPORT', help='time every step of every sprite and write a JSON report (default: profile.json)')
+    parser.add_argument('--cprofile', metavar='STATS', help='also run the build under cProfile and save the stats to STATS')
+    parser.add_argument('--top', type=int, default=10, help='slowest folders and steps to list in the profile (default: 10)')
+    args = parser.parse_args()
+
+    if args.profile:
+        profiling.enable()
+
+    watch_zip = None
+    if args.watch:
+        if args.atlas or args.optimize_png:
+            parser.error('--watch updates single files, it does not work with --atlas or --optimize-png')
+        # Builds go to output/ as usual and the mod zip is packed from there after every change
+        watch_zip, args.zip = args.zip, None
+
+    variants = load_palette_set(args.palettes) if args.palettes else None
+    index = load_index()
+    patterns = [ pattern for arg in args.species for pattern in arg.split(',') ] if args.species else None
+    dirs = select_dirs(index, args.dex, patterns)
+    if not dirs:
+        parser.error('no sprite folder matches --dex and --species')
+    infos = [ index[dir] for dir in dirs ]
+    # Anything a selective build leaves out stays as the last build made it
+    selective = len(dirs) < len(index) or args.only is not None
+    if selective and args.atlas:
+        # The textures are packed from scratch, the sheets left out would be lost from them
+        parser.error('--atlas packs every follow sprite at once, it does not work with --dex, --species or --only')
+    if args.atlas:
+        # Sheets are as big as atlasdata.txt's grid of slots
+        layout = get_follow_layout()
+        sheet = (layout['columns'] * layout['slot'], layout['rows'] * layout['slot'])
+        if sheet[0] > args.atlas or sheet[1] > args.atlas:
+            parser.error(f'--atlas {args.atlas} is smaller than the {sheet[0]}x{sheet[1]} follow sprite sheets')
+
+    jobs = args.jobs or os.cpu_count()
+    if args.zip:
+        # The zip only takes the entries that changed, but it has to see all of them
+        sink = sinks.ZipSink(args.zip, jobs, prune=not selective)
+        manifest = {}
+        args.force = True
+    else:
+        sink = sinks.DirectorySink()
+        os.makedirs('output', exist_ok=True)
+
+        # Drop whatever was built from sprite folders that no longer exist
+        manifest = load_manifest()
+        for dir in set(manifest) - set(index):
+            remove_outputs(manifest.pop(dir), sink=sink)
+
+    if args.optimize_png:
+        sink = sinks.OptimizingSink(sink, jobs)
+    if args.atlas:
+        sink = sinks.AtlasSink(sink, args.atlas, sheet)
+
+    entries = [ manifest.get(dir) for dir in dirs ]
+    previous_outputs = [ get_outputs(entry) for entry in entries ]
+
+    if args.cprofile:
+        # Only sees the parent process, best used without --jobs
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        results = profiler.runcall(build_sprites, dirs, entries, args.force, sink, jobs, variants, infos, args.pipeline, args.only, args.shiny_icons)
+        profiler.dump_stats(args.cprofile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(args.top)
+    else:
+        results = build_sprites(dirs, entries, args.force, sink, jobs, variants, infos, args.pipeline, args.only, args.shiny_icons)
 
-    shutil.copyfile('resources/atlasdata.txt', 'output/sprites/followsprites/atlasdata.txt')
+    sinks.write_file(sink, 'sprites/followsprites/atlasdata.txt', 'resources/atlasdata.txt')
     print('Added atlas file for followersprites')
+
+    if args.zip:
+        sinks.write_file(sink, 'icon.png', 'resources/icon.png')
+        sinks.write_file(sink, 'info.xml', 'resources/info.xml')
+    else:
+        remove_stale_outputs(previous_outputs, results, sink)
+        if not args.atlas and not selective:
+            # Every follow sprite was just written loose, an atlas from an --atlas build is out of date
+            sinks.remove_atlas(sink)
+        manifest.update(zip(dirs, results))
+        save_manifest(manifest)
+
+    sink.close()
+    if not args.zip:
+        # A --zip build leaves output/ alone, the next run lists sprites/ again
+        save_index(index)
+
+    if args.profile:
+        profiling.write_report(args.profile, args.top)
+
+    if args.watch:
+        if watch_zip:
+            write_mod_zip(watch_zip)
+        watch_sprites(index, manifest, sink, variants, watch_zip, args.watch, args.dex, patterns, args.only, args.shiny_icons)
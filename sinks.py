@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import os
+import pngopt
+import time
+import zlib
+from concurrent import futures
+from io import BytesIO
+from lazy import lazy_import
+
+Image = lazy_import('PIL.Image')
+zipfile = lazy_import('zipfile')
+
+# Where the create_* functions put their results. Names are archive style paths
+# like 'sprites/battlesprites/1-front-n.gif', the same for every sink.
+
+class DirectorySink:
+    # Loose files under root, the layout script.py has always produced
+    def __init__(self, root='output'):
+        self.root = root
+
+    def write(self, name: str, data: bytes):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.root, name))
+
+    def remove(self, name: str) -> bool:
+        # True if there was something to remove
+        if not self.exists(name):
+            return False
+        os.remove(os.path.join(self.root, name))
+        return True
+
+    def worker_sink(self):
+        # Workers only check what exists here, their files are written back in
+        # order by the parent so a parallel run ends up exactly like a serial one
+        return MemorySink(self)
+
+    def close(self):
+        pass
+
+class ZipSink:
+    # Brings the zip at file_path up to date with what was written, a build that
+    # changed one sprite only touches that sprite's entries. Entries are compared
+    # by CRC and size with the archive's central directory, new and changed ones
+    # are appended on close and the ones nothing was written to are dropped.
+    # Dropped and replaced entries leave their old data behind, the archive is
+    # rewritten once that is more than half of it. Nothing is held but the
+    # changed files, and the archive is not touched before close. With prune
+    # False entries are only ever replaced, for builds of part of the mod.
+    #
+    # Every changed file is deflated on jobs threads first (zlib lets go of the
+    # GIL) and only stored deflated if that saves at least MIN_GAIN of it, gifs
+    # and pngs often don't get any smaller.
+    MIN_GAIN = 0.05
+
+    def __init__(self, file_path: str, jobs=None, level=6, prune=True):
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        self.file_path = file_path
+        self.prune = prune
+        self.jobs = jobs or os.cpu_count()
+        self.level = level
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                self.entries = { info.filename: (info.CRC, info.file_size) for info in archive.infolist() }
+        except (FileNotFoundError, zipfile.BadZipFile):
+            self.entries = None
+        self.written = set()
+        self.changed = {}
+
+    def write(self, name: str, data: bytes):
+        self.written.add(name)
+        if self.entries and self.entries.get(name) == (zlib.crc32(data), len(data)):
+            self.changed.pop(name, None)
+        else:
+            self.changed[name] = data
+
+    def exists(self, name: str) -> bool:
+        # Only what gets written again is kept, so everything has to be made
+        return False
+
+    def remove(self, name: str) -> bool:
+        return False
+
+    def worker_sink(self):
+        # The zip can only be written from one process, workers hand their files back
+        return MemorySink()
+
+    def deflate(self, data: bytes):
+        # (deflated data or None if storing is as good, seconds spent)
+        start = time.perf_counter()
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) > len(data) * (1 - self.MIN_GAIN):
+            compressed = None
+        return compressed, time.perf_counter() - start
+
+    def close(self):
+        start = time.perf_counter()
+        if self.entries is not None:
+            removed = [ name for name in self.entries if name not in self.written ] if self.prune else []
+            dropped = removed + [ name for name in self.changed if name in self.entries ]
+            if not self.changed and not removed:
+                print(f'{self.file_path} is up to date')
+                return
+
+        with futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            deflated = list(executor.map(self.deflate, self.changed.values()))
+        entries = [ (name, data, compressed) for (name, data), (compressed, seconds) in zip(self.changed.items(), deflated) ]
+
+        if self.entries is None:
+            with zipfile.ZipFile(self.file_path, 'w') as archive:
+                for entry in entries:
+                    write_zip_entry(archive, *entry)
+            print(f'Wrote {len(entries)} entries to {self.file_path} in {time.perf_counter() - start:.2f}s')
+        elif not entries:
+            # Appending starts where the old central directory is, with nothing to
+            # append it would never be written again
+            self.compact()
+        else:
+            with zipfile.ZipFile(self.file_path, 'a') as archive:
+                for name in dropped:
+                    # Gone from the central directory, its data is dead space from now on
+                    archive.filelist.remove(archive.NameToInfo.pop(name))
+                for entry in entries:
+                    write_zip_entry(archive, *entry)
+                live = sum(30 + len(info.filename.encode()) + len(info.extra) + info.compress_size for info in archive.filelist)
+                dead = archive.start_dir - live
+            if dead > live:
+                self.compact()
+        if self.entries is not None:
+            print(f'Updated {self.file_path} in {time.perf_counter() - start:.3f}s: {len(entries)} entries written, {len(removed)} removed, {len(self.written) - len(entries)} unchanged')
+
+        # Files, deflated files, bytes before and after, seconds deflating per file type
+        totals = {}
+        for (name, data, compressed), (_, seconds) in zip(entries, deflated):
+            total = totals.setdefault(os.path.splitext(name)[1] or name, [0, 0, 0, 0, 0.0])
+            total[0] += 1
+            total[1] += compressed is not None
+            total[2] += len(data)
+            total[3] += len(data if compressed is None else compressed)
+            total[4] += seconds
+        for kind, (count, deflated_count, before, after, seconds) in sorted(totals.items()):
+            print(f'  {kind}: {count} files, {deflated_count} deflated, {before} -> {after} bytes, saved {before - after} ({(before - after) / (before or 1) * 100:.1f}%), {seconds:.2f}s deflating')
+
+    def compact(self):
+        # A copy with only the entries that were written, swapped in when it is complete
+        temp_path = self.file_path + '.tmp'
+        with zipfile.ZipFile(self.file_path) as old, zipfile.ZipFile(temp_path, 'w') as new:
+            for info in old.infolist():
+                if info.filename in self.written or not self.prune:
+                    new.writestr(info, old.read(info))
+        os.replace(temp_path, self.file_path)
+
+def write_zip_entry(archive: zipfile.ZipFile, name: str, data: bytes, compressed=None):
+    # writestr() would deflate everything again, so the already deflated data
+    # (or data, stored) goes in as is after the last entry
+    info = zipfile.ZipInfo(name, time.localtime()[:6])
+    info.external_attr = 0o600 << 16
+    info.compress_type = zipfile.ZIP_STORED if compressed is None else zipfile.ZIP_DEFLATED
+    info.CRC = zlib.crc32(data)
+    info.file_size = len(data)
+    info.compress_size = len(data if compressed is None else compressed)
+    info.header_offset = archive.start_dir
+    archive.fp.seek(archive.start_dir)
+    archive.fp.write(info.FileHeader())
+    archive.fp.write(data if compressed is None else compressed)
+    archive.start_dir = archive.fp.tell()
+    archive.filelist.append(info)
+    archive.NameToInfo[name] = info
+    # What writestr() sets so close() writes the central directory
+    archive._didModify = True
+
+class MemorySink:
+    # Collects (name, data) pairs, exists() is answered by base if there is one
+    def __init__(self, base=None):
+        self.base = base
+        self.files = []
+
+    def write(self, name: str, data: bytes):
+        self.files.append((name, data))
+
+    def exists(self, name: str) -> bool:
+        return self.base.exists(name) if self.base else False
+
+    def remove(self, name: str) -> bool:
+        return False
+
+    def worker_sink(self):
+        return MemorySink()
+
+    def close(self):
+        pass
+
+class AtlasSink:
+    # Packs the follow sprite sheets into a few large textures instead of a png
+    # per sheet, everything else goes straight through to base. On close the
+    # textures are written as sprites/followsprites/atlas-0.png, atlas-1.png, ...
+    # next to atlasindex.txt, which maps every sheet to its rectangle:
+    #
+    #   1-b-n=0,0,0,128,128
+    #
+    # sheet name = texture, x, y, width, height. Sheets are placed on a grid of
+    # sheet (width, height) cells in the order they are written, so a parallel
+    # build packs the same as a serial one.
+    def __init__(self, base, size=2048, sheet=(128, 128)):
+        if sheet[0] > size or sheet[1] > size:
+            raise ValueError(f'{sheet[0]}x{sheet[1]} sheets do not fit in {size}x{size} textures')
+        self.base = base
+        self.size = size
+        self.sheet = sheet
+        self.sheets = []
+
+    def is_packed(self, name: str) -> bool:
+        return name.startswith('sprites/followsprites/') and name.endswith('.png')
+
+    def write(self, name: str, data: bytes):
+        if self.is_packed(name):
+            self.sheets.append((name, data))
+            # A loose copy from an earlier unpacked build would only get in the way
+            self.base.remove(name)
+        else:
+            self.base.write(name, data)
+
+    def exists(self, name: str) -> bool:
+        # The textures are rebuilt from scratch every time, so every sheet has to be made again
+        return False if self.is_packed(name) else self.base.exists(name)
+
+    def remove(self, name: str) -> bool:
+        return self.base.remove(name)
+
+    def worker_sink(self):
+        # Workers pack nothing, they only need to answer exists() the same way
+        return MemorySink(AtlasSink(self.base.worker_sink(), self.size, self.sheet))
+
+    def close(self):
+        if not self.sheets:
+            # The follow sprites were not built this time, the atlas already there still holds
+            self.base.close()
+            return
+
+        width, height = self.sheet
+        columns = self.size // width
+        per_texture = columns * (self.size // height)
+        index = []
+
+        for texture, start in enumerate(range(0, len(self.sheets), per_texture)):
+            sheets = self.sheets[start:start + per_texture]
+            # The last texture is cut down to the rows it uses
+            rows = (len(sheets) + columns - 1) // columns
+            canvas = Image.new('RGBA', (self.size, rows * height), (255, 255, 255, 0))
+
+            for i, (name, data) in enumerate(sheets):
+                image = Image.open(BytesIO(data))
+                if image.size != self.sheet:
+                    # It would overlap its neighbours or leave a gap the index doesn't show
+                    raise ValueError(f'{name} is {image.size[0]}x{image.size[1]}, the atlas grid is {width}x{height}')
+                x, y = i % columns * width, i // columns * height
+                canvas.paste(image, (x, y))
+                key = os.path.basename(name).removesuffix('.png')
+                index.append(f'{key}={texture},{x},{y},{image.size[0]},{image.size[1]}')
+
+            f = BytesIO()
+            canvas.save(f, 'PNG')
+            self.base.write(f'sprites/followsprites/atlas-{texture}.png', f.getvalue())
+
+        textures = (len(self.sheets) + per_texture - 1) // per_texture
+        header = [ f'size={self.size}', f'textures={textures}', '' ]
+        self.base.write('sprites/followsprites/atlasindex.txt', '\n'.join(header + index).encode() + b'\n')
+
+        # Textures left over from an earlier atlas that needed more of them
+        remove_atlas(self.base, textures)
+        self.base.close()
+
+class OptimizingSink:
+    # Holds back the follow sprite and monster icon pngs and writes them to base
+    # losslessly recompressed by pngopt on close, spread over jobs processes.
+    # Wrap it in an AtlasSink, not the other way around, so the atlas textures
+    # are what gets optimized.
+    def __init__(self, base, jobs=1):
+        self.base = base
+        self.jobs = jobs
+        self.pngs = []
+
+    def is_optimized(self, name: str) -> bool:
+        return name.endswith('.png') and name.startswith(('sprites/followsprites/', 'sprites/monstericons/'))
+
+    def write(self, name: str, data: bytes):
+        if self.is_optimized(name):
+            self.pngs.append((name, data))
+        else:
+            self.base.write(name, data)
+
+    def exists(self, name: str) -> bool:
+        # Files from an unoptimized build would be kept as they are, so they are all made again
+        return False if self.is_optimized(name) else self.base.exists(name)
+
+    def remove(self, name: str) -> bool:
+        return self.base.remove(name)
+
+    def worker_sink(self):
+        return MemorySink(OptimizingSink(self.base.worker_sink()))
+
+    def close(self):
+        start = time.perf_counter()
+        datas = [ data for name, data in self.pngs ]
+        if self.jobs > 1:
+            with futures.ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                optimized = list(executor.map(pngopt.optimize_png, datas, chunksize=16))
+        else:
+            optimized = [ pngopt.optimize_png(data) for data in datas ]
+
+        # Bytes before and after per output folder
+        totals = {}
+        for (name, data), optimized_data in zip(self.pngs, optimized):
+            self.base.write(name, optimized_data)
+            total = totals.setdefault(os.path.dirname(name), [0, 0, 0])
+            total[0] += 1
+            total[1] += len(data)
+            total[2] += len(optimized_data)
+
+        seconds = time.perf_counter() - start
+        for folder, (count, before, after) in totals.items():
+            print(f'Optimized {count} pngs in {folder}: {before} -> {after} bytes, saved {before - after} ({(before - after) / (before or 1) * 100:.1f}%)')
+        print(f'Optimized pngs in {seconds:.2f}s')
+        self.base.close()
+
+def write_file(sink, name: str, file_path: str):
+    with open(file_path, 'rb') as f:
+        sink.write(name, f.read())
+
+def remove_atlas(sink, start=0):
+    # The textures of an earlier AtlasSink from atlas-{start}.png on, and its
+    # index unless some of the textures are kept
+    if start == 0:
+        sink.remove('sprites/followsprites/atlasindex.txt')
+    while sink.remove(f'sprites/followsprites/atlas-{start}.png'):
+        start += 1